@@ -0,0 +1,73 @@
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from job import queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the queued background jobs with --concurrency worker threads until it is stopped (SIGINT or '
+        'SIGTERM, which lets the running jobs finish first). Run it in as many processes as needed, the '
+        'workers never take the same job'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default=4, type=int, help='How many jobs to run at the same time')
+        parser.add_argument(
+            '--poll-interval', default=settings.JOB_POLL_INTERVAL, type=float,
+            help='How many seconds an idle worker waits before checking for jobs again',
+        )
+        parser.add_argument('--burst', action='store_true', help='Stop once there are no more due jobs')
+
+    def work(self, stop, options, counts, lock):
+        try:
+            while not stop.is_set():
+                try:
+                    job = queue.claim()
+                    if job is None:
+                        if options['burst']:
+                            break
+                        stop.wait(options['poll_interval'])
+                        continue
+                    succeeded = queue.run(job)
+                except DatabaseError:
+                    # i.e the database restarted, the job (if any) is retried once it's stale
+                    queue.logger.exception("The worker lost the database, reconnecting")
+                    connection.close()
+                    stop.wait(options['poll_interval'])
+                    continue
+                with lock:
+                    counts['succeeded' if succeeded else 'failed'] += 1
+        finally:
+            # every thread has its own connection
+            connection.close()
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        counts = {'succeeded': 0, 'failed': 0}
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(target=self.work, args=(stop, options, counts, lock), name=f"worker-{i}")
+            for i in range(options['concurrency'])
+        ]
+        started = time.monotonic()
+        print(f"--- Running {options['concurrency']} workers")
+        for thread in threads:
+            thread.start()
+
+        # meanwhile, look out for jobs whose worker died (i.e a previous run was killed)
+        while any(thread.is_alive() for thread in threads):
+            queue.requeue_stale()
+            for thread in threads:
+                thread.join(timeout=options['poll_interval'])
+
+        elapsed = time.monotonic() - started
+        print(f"--- Ran {counts['succeeded'] + counts['failed']} jobs ({counts['failed']} failed) in {elapsed:.1f}s")
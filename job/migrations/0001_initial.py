@@ -0,0 +1,40 @@
+# Generated by Django 4.1 on 2026-10-18 18:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, help_text='The datetime this was created')),
+                ('date_updated', models.DateTimeField(auto_now=True, help_text='The datetime this was updated')),
+                ('task', models.CharField(help_text='The name of the task to run, the dotted path to its function', max_length=200)),
+                ('kwargs', models.JSONField(blank=True, default=dict, help_text='The keyword arguments to call the task with')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', help_text='Whether the job is waiting to run, running or has run out of attempts', max_length=10)),
+                ('dedupe_key', models.CharField(blank=True, default=None, help_text='Only one pending job can have this key, queueing another one with it does nothing', max_length=200, null=True)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the job is due to run, pushed back every time it is retried')),
+                ('started_at', models.DateTimeField(blank=True, default=None, help_text='When a worker last picked the job up', null=True)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='How many times the job has been run')),
+                ('max_attempts', models.PositiveIntegerField(help_text='How many times the job is run before giving up on it')),
+                ('last_error', models.TextField(blank=True, default='', help_text='The traceback of the last failed attempt')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['run_at', 'id'], name='job_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('dedupe_key',), name='job_pending_dedupe_key'),
+        ),
+    ]
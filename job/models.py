@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from supply.generics.mixins import ModelWithDatetime
+
+
+class JobQuerySet(models.QuerySet):
+    def due(self):
+        return self.filter(status=Job.PENDING, run_at__lte=timezone.now())
+
+    def stale(self):
+        """
+        Jobs that have been running for so long that their worker has most likely
+        died
+        """
+        return self.filter(status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT))
+
+
+class Job(ModelWithDatetime):
+    """
+    Work to be done outside of the request that asked for it, by the workers of
+    the run_workers command. See job.queue for queueing and running jobs.
+
+    Jobs are deleted once they've run successfully, so what's left are the ones
+    still to run and the ones that have failed for good.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+    task = models.CharField(
+        max_length=200,
+        help_text="The name of the task to run, the dotted path to its function"
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="The keyword arguments to call the task with"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=[(PENDING, "Pending"), (RUNNING, "Running"), (FAILED, "Failed")],
+        default=PENDING,
+        help_text="Whether the job is waiting to run, running or has run out of attempts"
+    )
+    dedupe_key = models.CharField(
+        max_length=200,
+        default=None,
+        null=True,
+        blank=True,
+        help_text="Only one pending job can have this key, queueing another one with it does nothing"
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the job is due to run, pushed back every time it is retried"
+    )
+    started_at = models.DateTimeField(
+        default=None,
+        null=True,
+        blank=True,
+        help_text="When a worker last picked the job up"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="How many times the job has been run"
+    )
+    max_attempts = models.PositiveIntegerField(
+        help_text="How many times the job is run before giving up on it"
+    )
+    last_error = models.TextField(
+        blank=True,
+        default="",
+        help_text="The traceback of the last failed attempt"
+    )
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"], condition=models.Q(status="pending"), name="job_pending_dedupe_key"
+            ),
+        ]
+        indexes = [
+            # the queue the workers take the next job from
+            models.Index(fields=["run_at", "id"], condition=models.Q(status="pending"), name="job_due_idx"),
+        ]
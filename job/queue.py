@@ -0,0 +1,160 @@
+"""
+A job queue kept in the database, for work that doesn't need to hold up the
+request that causes it.
+
+Tasks are plain functions registered with `@task` in a `tasks` module of an
+app. A job is only queued once the transaction of the write that needs it has
+been committed, so it never exists without that write and never runs before the
+write can be seen:
+
+    @task
+    def refresh_aggregates(product_id):
+        ...
+
+    refresh_aggregates.enqueue(product_id=1, dedupe_key="product-aggregates:1")
+
+The workers of the run_workers command take the due jobs one at a time with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of them can work through the
+queue without waiting on each other or running a job twice. Failed jobs are
+retried with exponential backoff until they run out of attempts, and a job
+with a dedupe key isn't queued again while one with the same key is waiting.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from job.models import Job
+
+logger = logging.getLogger("job.queue")
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, max_attempts=None):
+        self.func = func
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.max_attempts = max_attempts
+        update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def job(self, dedupe_key=None, delay=0, **kwargs):
+        """
+        An unsaved job to run this task with `kwargs`, which have to be JSON
+        serializable, after `delay` seconds. Pass a list of these to `enqueue` to
+        queue several at once.
+        """
+        return Job(
+            task=self.name,
+            kwargs=kwargs,
+            dedupe_key=dedupe_key,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            max_attempts=self.max_attempts or settings.JOB_MAX_ATTEMPTS,
+        )
+
+    def enqueue(self, dedupe_key=None, delay=0, **kwargs):
+        enqueue([self.job(dedupe_key=dedupe_key, delay=delay, **kwargs)])
+
+
+def task(func=None, max_attempts=None):
+    """
+    Registers `func` as a task that can be queued, either as `@task` or as
+    `@task(max_attempts=...)`
+    """
+    if func is None:
+        return lambda func: task(func, max_attempts=max_attempts)
+    registered = Task(func, max_attempts)
+    TASKS[registered.name] = registered
+    return registered
+
+
+def enqueue(jobs):
+    """
+    Queues the given jobs in a single INSERT once the current transaction has
+    been committed (or straight away outside of one). Any with the dedupe key of
+    a job that is already waiting to run are skipped.
+
+    Inserting them any earlier would skip a job whose key is taken by one that a
+    worker can claim and run before the write it was queued for is committed,
+    and that write would then never be picked up.
+    """
+    jobs = list(jobs)
+    transaction.on_commit(lambda: Job.objects.bulk_create(jobs, ignore_conflicts=True))
+
+
+def claim():
+    """
+    Takes the next due job off the queue, or returns None if there isn't one.
+    Jobs that another worker is in the middle of claiming are skipped rather
+    than waited for.
+    """
+    with transaction.atomic():
+        job = Job.objects.due().order_by("run_at", "id").select_for_update(skip_locked=True).first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "attempts", "date_updated"])
+    return job
+
+
+def run(job):
+    """
+    Runs a claimed job in a transaction of its own, and returns whether it
+    succeeded. Successful jobs are deleted, failed ones retried later.
+    """
+    try:
+        if job.task not in TASKS:
+            raise LookupError(f"There is no task called {job.task}")
+        with transaction.atomic():
+            TASKS[job.task].func(**job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s of %s", job.pk, job.task, job.attempts, job.max_attempts)
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def get_retry_delay(attempts):
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_MAX_RETRY_DELAY)
+    # spread the retries out a little, so that jobs that failed together don't all retry at once
+    return delay * random.uniform(1, 1.25)
+
+
+def fail(job, error):
+    if job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=error, date_updated=timezone.now())
+        return
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.PENDING,
+                run_at=timezone.now() + timedelta(seconds=get_retry_delay(job.attempts)),
+                last_error=error,
+                date_updated=timezone.now(),
+            )
+    except IntegrityError:
+        # the same work has been queued again since, which takes care of this one
+        Job.objects.filter(pk=job.pk).delete()
+
+
+def requeue_stale():
+    """
+    Gives the jobs of workers that died while running them another go, as a
+    failed attempt
+    """
+    jobs = list(Job.objects.stale())
+    for job in jobs:
+        logger.warning("Job %s (%s) has been running since %s, retrying it", job.pk, job.task, job.started_at)
+        fail(job, f"The job ran for more than {settings.JOB_TIMEOUT} seconds without finishing")
+    return len(jobs)
@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from job import queue
+from job.models import Job
+from product.factories import OfferFactory
+from product.models import Product
+from product.tasks import refresh_aggregates
+
+
+@queue.task(max_attempts=2)
+def failing_task(message):
+    raise ValueError(message)
+
+
+@override_settings(DEFERRED_AGGREGATES=True)
+class EnqueueTests(TestCase):
+    def test_queued_once_the_write_is_committed(self):
+        offer = OfferFactory(quantity=10)
+        Product.objects.refresh_aggregates()
+
+        # a refresh of the product is already waiting to run
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_aggregates.enqueue(product_id=offer.product_id, dedupe_key=f"product-aggregates:{offer.product_id}")
+        pending = Job.objects.get()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            offer.quantity = 5
+            offer.save()
+            # nothing is queued for the change until it's committed...
+            self.assertEqual(list(Job.objects.all()), [pending])
+            # ...so a worker taking the waiting refresh in the meantime doesn't take its place
+            job = queue.claim()
+            self.assertEqual(job, pending)
+            self.assertTrue(queue.run(job))
+            self.assertFalse(Job.objects.exists())
+
+        # the change is committed
+        for callback in callbacks:
+            callback()
+        job = queue.claim()
+        self.assertEqual(job.kwargs, {"product_id": offer.product_id})
+        self.assertTrue(queue.run(job))
+        self.assertEqual(Product.objects.get(pk=offer.product_id).available_quantity, 5)
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_MAX_RETRY_DELAY=60, JOB_TIMEOUT=60)
+class QueueTests(TestCase):
+    def enqueue(self, task, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            task.enqueue(**kwargs)
+
+    def make_due(self):
+        Job.objects.update(run_at=timezone.now())
+
+    def test_dedupe(self):
+        self.enqueue(failing_task, message="a", dedupe_key="a")
+        self.enqueue(failing_task, message="b", dedupe_key="a")
+        self.enqueue(failing_task, message="c", dedupe_key="c")
+        self.enqueue(failing_task, message="d")
+        self.assertEqual(sorted(job.kwargs["message"] for job in Job.objects.all()), ["a", "c", "d"])
+
+        # once it's running, the same work can be queued again
+        job = queue.claim()
+        self.assertEqual(job.kwargs, {"message": "a"})
+        self.enqueue(failing_task, message="e", dedupe_key="a")
+        self.assertTrue(Job.objects.filter(dedupe_key="a", status=Job.PENDING).exists())
+        # in which case the running one isn't retried, as the new one takes care of it
+        with self.assertLogs("job.queue", "ERROR"):
+            self.assertFalse(queue.run(job))
+        self.assertEqual(list(Job.objects.filter(dedupe_key="a").values_list("kwargs", flat=True)), [{"message": "e"}])
+
+    def test_retry(self):
+        self.enqueue(failing_task, message="nope")
+        job = queue.claim()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        with self.assertLogs("job.queue", "ERROR"):
+            self.assertFalse(queue.run(job))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn("ValueError: nope", job.last_error)
+        # retried later rather than straight away
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=9))
+        self.assertIsNone(queue.claim())
+
+        # and given up on after max_attempts
+        self.make_due()
+        with self.assertLogs("job.queue", "ERROR"):
+            self.assertFalse(queue.run(queue.claim()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNone(queue.claim())
+
+    def test_retry_delay(self):
+        # doubles with every attempt, with up to a quarter added to spread the retries out
+        for attempts, delay in [(1, 10), (2, 20), (3, 40), (4, 60), (10, 60)]:
+            self.assertTrue(delay <= queue.get_retry_delay(attempts) <= delay * 1.25)
+
+    def test_unknown_task(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue.enqueue([Job(task="job.tests.missing", max_attempts=1)])
+        with self.assertLogs("job.queue", "ERROR"):
+            self.assertFalse(queue.run(queue.claim()))
+        self.assertIn("There is no task called job.tests.missing", Job.objects.get(status=Job.FAILED).last_error)
+
+    def test_requeue_stale(self):
+        self.enqueue(failing_task, message="nope")
+        job = queue.claim()
+        self.assertEqual(queue.requeue_stale(), 0)
+
+        Job.objects.update(started_at=timezone.now() - timedelta(seconds=61))
+        with self.assertLogs("job.queue", "WARNING"):
+            self.assertEqual(queue.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn("without finishing", job.last_error)
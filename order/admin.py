@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from order.models import Order, OrderLine
+from order.models import Allocation, Order, OrderLine
 
 admin.site.register(OrderLine)
 admin.site.register(Order)
+admin.site.register(Allocation)
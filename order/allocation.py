@@ -0,0 +1,55 @@
+"""
+Decides which sellers' offers supply an order line.
+
+For now this goes for the cheapest offers first, and the ones with the most
+stock after that, splitting a line over several offers when no single seller
+has enough. In practice this should probably grow into a whole service that
+1. takes into account historical seller performance to fulfill the order
+2. considers geographical proximity
+3. takes MOQ amounts into consideration
+4. considers historical quality of the supplied product
+5. various other heuristics passed off to some ML megamind
+"""
+from product.models import Offer
+
+
+def get_offers(product_ids):
+    """
+    The offers with stock for each of the given products, in the order we'd
+    rather allocate from them. This is a single query on the
+    (product, seller_price, quantity) index.
+    """
+    offers = {}
+    for offer in Offer.objects.filter(
+        product_id__in=product_ids, quantity__gt=0
+    ).order_by("product_id", "seller_price", "-quantity", "id"):
+        offers.setdefault(offer.product_id, []).append(offer)
+    return offers
+
+
+def allocate(offers, quantity):
+    """
+    Splits `quantity` over the given offers (as returned by get_offers) and
+    returns a list of `(offer, quantity)` pairs, or None if there isn't enough
+    stock across all of them.
+    """
+    allocations = []
+    remaining = quantity
+    for offer in offers:
+        if remaining <= 0:
+            break
+        taken = min(offer.quantity, remaining)
+        allocations.append((offer, taken))
+        remaining -= taken
+
+    if remaining > 0:
+        return None
+    return allocations
+
+
+def get_seller_id(allocations):
+    """
+    The seller of an order line allocated as given (see allocate): whoever
+    supplies the most of it
+    """
+    return max(allocations, key=lambda allocation: allocation[1])[0].seller_id
@@ -0,0 +1,107 @@
+"""
+Exports the order history a line per row, with the order each line belongs to
+alongside it.
+
+The rows come straight from `values()` over a single query that is read in
+chunks of EXPORT_CHUNK_SIZE (a server side cursor on Postgres), so no model
+instances are built and only one chunk is ever held in memory, however many
+orders there are.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from order.models import Allocation, OrderLine
+
+COLUMNS = [
+    "order_id",
+    "order_date",
+    "buyer_id",
+    "order_subtotal",
+    "order_shipping_cost",
+    "order_vat",
+    "order_total",
+    "line_id",
+    "product_id",
+    "product_name",
+    "gtin",
+    "seller_id",
+    "quantity",
+    "price",
+    "subtotal",
+]
+
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def filter_dates(rows, order, date_from, date_to):
+    if date_from:
+        rows = rows.filter(**{f"{order}__date_created__gte": start_of_day(date_from)})
+    if date_to:
+        rows = rows.filter(**{f"{order}__date_created__lt": start_of_day(date_to + timedelta(days=1))})
+    return rows
+
+
+def get_export_rows(user, role="buyer", date_from=None, date_to=None):
+    """
+    The lines of the confirmed orders `user` placed, or with `role="seller"` the
+    lines they supplied, optionally limited to orders created between
+    `date_from` and `date_to` (both inclusive)
+    """
+    if role == "seller":
+        return get_supplied_rows(user, date_from, date_to)
+
+    lines = filter_dates(
+        OrderLine.objects.filter(order__is_confirmed=True, order__buyer=user), "order", date_from, date_to
+    )
+    return lines.order_by("order_id", "id").values(
+        "order_id",
+        "product_id",
+        "seller_id",
+        "quantity",
+        "price",
+        "subtotal",
+        order_date=F("order__date_created"),
+        buyer_id=F("order__buyer_id"),
+        order_subtotal=F("order__subtotal"),
+        order_shipping_cost=F("order__shipping_cost"),
+        order_vat=F("order__vat"),
+        order_total=F("order__total"),
+        line_id=F("id"),
+        product_name=F("product__name"),
+        gtin=F("product__gtin"),
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def get_supplied_rows(user, date_from=None, date_to=None):
+    """
+    The same columns for the lines `user` supplied. A line can be split over the
+    offers of several sellers (see order.allocation), so these come from the
+    allocations of their offers: a row per line with just their part of it.
+    """
+    allocations = filter_dates(
+        Allocation.objects.filter(line__order__is_confirmed=True, seller=user), "line__order", date_from, date_to
+    )
+    return allocations.order_by("line__order_id", "line_id").values(
+        "line_id",
+        "quantity",
+        "seller_id",
+        order_id=F("line__order_id"),
+        product_id=F("line__product_id"),
+        price=F("line__price"),
+        subtotal=ExpressionWrapper(
+            F("quantity") * F("line__price"), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+        order_date=F("line__order__date_created"),
+        buyer_id=F("line__order__buyer_id"),
+        order_subtotal=F("line__order__subtotal"),
+        order_shipping_cost=F("line__order__shipping_cost"),
+        order_vat=F("line__order__vat"),
+        order_total=F("line__order__total"),
+        product_name=F("line__product__name"),
+        gtin=F("line__product__gtin"),
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
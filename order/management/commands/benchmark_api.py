@@ -0,0 +1,255 @@
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from product import seeding
+from product.models import Product
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class InProcessClient:
+    """
+    Calls the API through the Django test client, which lets us count the queries
+    every request makes
+    """
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+        self.headers = {}
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method.lower())(
+                path,
+                data=json.dumps(data) if data is not None else None,
+                content_type="application/json",
+                **self.headers,
+            )
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, len(queries)
+
+    def authenticate(self, token):
+        self.headers = {"HTTP_AUTHORIZATION": token}
+
+    def close(self):
+        connection.close()
+
+
+class HttpClient:
+    """
+    Calls a running server. The query counts are only known if it runs with
+    REQUEST_INSTRUMENTATION enabled, from its Server-Timing header.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Content-Type": "application/json", "Accept": "application/json"}
+
+    def request(self, method, path, data=None):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(data).encode() if data is not None else None,
+            headers=self.headers,
+            method=method,
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, headers, content = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            status, headers, content = error.code, error.headers, error.read()
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = None
+        queries = re.search(r'desc="(\d+) queries"', headers.get("Server-Timing", ""))
+        return status, body, int(queries.group(1)) if queries else None
+
+    def authenticate(self, token):
+        self.headers["Authorization"] = token
+
+    def close(self):
+        pass
+
+
+def percentile(values, percent):
+    # nearest rank, values must be sorted
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample["ms"] for sample in samples)
+    queries = [sample["queries"] for sample in samples if sample["queries"] is not None]
+    statuses = defaultdict(int)
+    for sample in samples:
+        statuses[str(sample["status"])] += 1
+
+    histogram = {}
+    remaining = latencies
+    for bucket in BUCKETS:
+        histogram[f"<={bucket}ms"] = sum(1 for value in remaining if value <= bucket)
+        remaining = [value for value in remaining if value > bucket]
+    histogram[f">{BUCKETS[-1]}ms"] = len(remaining)
+
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency_ms": {
+            "min": round(latencies[0], 2),
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "histogram": histogram,
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2),
+            "max": max(queries),
+        } if queries else None,
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs virtual users through the whole ordering flow (login, browsing products, updating the '
+        'cart, viewing it and checking out) and reports latency percentiles, throughput and queries '
+        'per request for every endpoint, along with a JSON report to compare runs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='The base URL of a running server, otherwise the test client is used')
+        parser.add_argument('--users', default=20, type=int, help='How many virtual users run at once')
+        parser.add_argument('--iterations', default=5, type=int, help='How many times every user orders')
+        parser.add_argument('--products', default=1000, type=int,
+                            help='Seeds products until the catalog has at least this many')
+        parser.add_argument('--cart-items', default=3, type=int, help='How many products go into every cart')
+        parser.add_argument('--output', default='benchmark-report.json', help='Where to write the JSON report')
+        parser.add_argument('--label', default='', help='A label to tell reports apart')
+
+    def seed(self, products):
+        missing = products - Product.objects.count()
+        if missing > 0:
+            taken = set(Product.objects.values_list('name', flat=True).iterator())
+            seller_ids = [seller.id for seller in seeding.create_sellers(max(10, missing // 100))]
+            seeding.seed_products(
+                list(seeding.generate_names(missing, taken)), seeding.get_next_gtin_number(), seller_ids, 3, 5000
+            )
+            print(f"--- Seeded {missing} products")
+
+    def run_user(self, client, username, iterations, cart_items, record):
+        def call(name, method, path, data=None):
+            started = time.perf_counter()
+            status, body, queries = client.request(method, path, data)
+            record(name, (time.perf_counter() - started) * 1000, status, queries)
+            return status, body
+
+        status, body = call("login", "POST", "/api/auth/login/", {"username": username, "password": "bench"})
+        if status != 200:
+            return
+        client.authenticate(body["token"])
+
+        for _ in range(iterations):
+            status, body = call("products", "GET", "/api/products/")
+            in_stock = [product["id"] for product in (body or {}).get("results", []) if product.get("quantity")]
+            if status != 200 or not in_stock:
+                continue
+            items = [
+                {"id": product_id, "quantity": 1}
+                for product_id in random.sample(in_stock, min(cart_items, len(in_stock)))
+            ]
+            call("update_cart", "POST", "/api/orders/update_cart/", items)
+            call("cart", "GET", "/api/orders/cart/")
+            call("checkout", "POST", "/api/orders/checkout/")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['iterations'] < 1 or options['cart_items'] < 1:
+            raise CommandError('--users, --iterations and --cart-items must be at least 1')
+
+        self.seed(options['products'])
+
+        run = uuid.uuid4().hex[:8]
+        User = get_user_model()
+        # hashing is slow on purpose, so all the users share the one hash
+        password = make_password('bench')
+        usernames = [f"bench-user-{run}-{i}" for i in range(options['users'])]
+        User.objects.bulk_create(User(username=username, password=password) for username in usernames)
+
+        samples = defaultdict(list)
+        lock = threading.Lock()
+
+        def record(name, ms, status, queries):
+            with lock:
+                samples[name].append({"ms": ms, "status": status, "queries": queries})
+
+        def work(username):
+            client = HttpClient(options['url']) if options['url'] else InProcessClient()
+            try:
+                self.run_user(client, username, options['iterations'], options['cart_items'], record)
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=work, args=(username,)) for username in usernames]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        User.objects.filter(username__in=usernames).delete()
+
+        if not samples:
+            raise CommandError('No requests were made')
+
+        report = {
+            "label": options['label'],
+            "commit": get_commit(),
+            "date": timezone.now().isoformat(),
+            "target": options['url'] or 'test client',
+            "database": connection.vendor,
+            "users": options['users'],
+            "iterations": options['iterations'],
+            "cart_items": options['cart_items'],
+            "products": Product.objects.count(),
+            "elapsed": round(elapsed, 2),
+            "overall": summarize([sample for values in samples.values() for sample in values], elapsed),
+            "endpoints": {name: summarize(values, elapsed) for name, values in samples.items()},
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+
+        print(f"--- {'endpoint':<12} {'requests':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+        for name, summary in list(report["endpoints"].items()) + [("overall", report["overall"])]:
+            latency = summary["latency_ms"]
+            queries = summary["queries_per_request"]["mean"] if summary["queries_per_request"] else "-"
+            print(f"--- {name:<12} {summary['requests']:>8} {summary['throughput']:>8} {latency['p50']:>8} "
+                  f"{latency['p95']:>8} {latency['p99']:>8} {queries:>8}")
+        print(f"--- Wrote the report to {options['output']}")
@@ -0,0 +1,90 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from order.models import Allocation, Order, OrderLine
+from product.factories import ProductFactory
+from product.models import Offer, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks out many carts for the same few products from several threads at once, to show '
+        'that stock is never oversold under contention and how many checkouts per second we manage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', default=200, type=int, help='How many carts to check out')
+        parser.add_argument('--products', default=3, type=int, help='How many products every cart contains')
+        parser.add_argument('--stock', default=100, type=int, help='The stock of each product')
+        parser.add_argument('--threads', default=8, type=int)
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        User = get_user_model()
+        seller = User.objects.create(username=f"bench-seller-{run}")
+        products = [ProductFactory() for _ in range(options['products'])]
+        offers = [
+            Offer.objects.create(product=product, seller=seller, quantity=options['stock'], seller_price=10)
+            for product in products
+        ]
+        buyers = User.objects.bulk_create(
+            User(username=f"bench-buyer-{run}-{i}") for i in range(options['buyers'])
+        )
+        carts = Order.objects.bulk_create(Order(buyer=buyer) for buyer in buyers)
+        lines = OrderLine.objects.bulk_create(
+            OrderLine(order=cart, product=product, seller=seller, quantity=1, price=10, subtotal=10)
+            for cart in carts for product in products
+        )
+        offers_by_product = {offer.product_id: offer for offer in offers}
+        Allocation.objects.bulk_create(
+            Allocation(line=line, offer=offers_by_product[line.product_id], seller=seller, quantity=1) for line in lines
+        )
+        Order.objects.filter(id__in=[cart.id for cart in carts]).recalculate_totals()
+
+        results = {"confirmed": 0, "rejected": 0}
+        lock = threading.Lock()
+
+        def work(chunk):
+            for cart in chunk:
+                try:
+                    cart.checkout()
+                    outcome = "confirmed"
+                except ValidationError:
+                    outcome = "rejected"
+                with lock:
+                    results[outcome] += 1
+            connection.close()
+
+        chunks = [carts[i::options['threads']] for i in range(options['threads'])]
+        threads = [threading.Thread(target=work, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        oversold = False
+        for offer in offers:
+            offer.refresh_from_db()
+            sold = OrderLine.objects.filter(
+                order__is_confirmed=True, product_id=offer.product_id
+            ).aggregate(total=Sum("quantity"))["total"] or 0
+            if sold + offer.quantity != options['stock'] or sold > options['stock']:
+                oversold = True
+            print(f"--- Product {offer.product_id}: sold {sold}, {offer.quantity} left of {options['stock']}")
+
+        print(f"--- {results['confirmed']} checkouts confirmed, {results['rejected']} rejected")
+        print(f"--- {len(carts) / elapsed:.1f} checkouts/s over {options['threads']} threads ({elapsed:.2f}s)")
+        print("--- Stock was OVERSOLD" if oversold else "--- No stock was oversold")
+
+        Product.objects.filter(id__in=[product.id for product in products]).delete()
+        User.objects.filter(username__startswith=f"bench-buyer-{run}").delete()
+        seller.delete()
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from order.management.commands.benchmark_api import HttpClient, get_commit, summarize
+
+ENDPOINTS = ["/api/products/", "/api/orders/", "/api/orders/cart/"]
+
+
+class Command(BaseCommand):
+    help = (
+        'Holds an increasing number of concurrent connections open against the read endpoints of one or '
+        'more running servers (i.e the WSGI and the ASGI deployment) and reports how many connections '
+        'each handles within the latency budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', help='Servers to compare as label=url, i.e wsgi=http://localhost:8000')
+        parser.add_argument('--connections', default='10,50,100,200', help='Comma separated concurrency levels')
+        parser.add_argument('--duration', default=10, type=float, help='Seconds to run every level for')
+        parser.add_argument('--budget', default=500, type=float, help='The p99 latency budget in milliseconds')
+        parser.add_argument('--output', default='concurrency-report.json', help='Where to write the JSON report')
+
+    def run_level(self, url, token, connections, duration):
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def work(offset):
+            client = HttpClient(url)
+            client.authenticate(token)
+            index = offset
+            while time.perf_counter() < deadline:
+                path = ENDPOINTS[index % len(ENDPOINTS)]
+                started = time.perf_counter()
+                try:
+                    status, _, queries = client.request("GET", path)
+                except OSError:
+                    status, queries = "error", None
+                with lock:
+                    samples[path].append({
+                        "ms": (time.perf_counter() - started) * 1000, "status": status, "queries": queries
+                    })
+                index += 1
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(connections)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        overall = summarize([sample for values in samples.values() for sample in values], elapsed)
+        return {
+            "connections": connections,
+            "overall": overall,
+            "endpoints": {path: summarize(values, elapsed) for path, values in samples.items()},
+        }
+
+    def handle(self, *args, **options):
+        try:
+            targets = dict(target.split('=', 1) for target in options['targets'])
+            levels = [int(level) for level in options['connections'].split(',')]
+        except ValueError:
+            raise CommandError('Targets should look like label=url and --connections like 10,50,100')
+
+        User = get_user_model()
+        username = f"bench-user-{uuid.uuid4().hex[:8]}"
+        user = User(username=username)
+        user.set_password('bench')
+        user.save()
+
+        report = {"commit": get_commit(), "duration": options['duration'], "budget": options['budget'], "targets": {}}
+        try:
+            for label, url in targets.items():
+                client = HttpClient(url)
+                status, body, _ = client.request("POST", "/api/auth/login/", {"username": username, "password": "bench"})
+                if status != 200:
+                    raise CommandError(f"Couldn't log in to {url} ({status})")
+
+                results = []
+                capacity = 0
+                for level in levels:
+                    result = self.run_level(url, body["token"], level, options['duration'])
+                    results.append(result)
+                    overall = result["overall"]
+                    ok = set(overall["statuses"]) <= {"200", "304"}
+                    if ok and overall["latency_ms"]["p99"] <= options['budget']:
+                        capacity = level
+                    print(f"--- {label} {level:>5} connections: {overall['throughput']:>8} req/s, "
+                          f"p50 {overall['latency_ms']['p50']}ms, p99 {overall['latency_ms']['p99']}ms, "
+                          f"statuses {overall['statuses']}")
+                report["targets"][label] = {"url": url, "capacity": capacity, "levels": results}
+                print(f"--- {label} handled {capacity} connections within {options['budget']:.0f}ms p99")
+        finally:
+            User.objects.filter(username=username).delete()
+
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f"--- Wrote the report to {options['output']}")
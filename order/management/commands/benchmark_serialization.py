@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer as StdlibJSONRenderer
+
+from order.models import Order
+from order.serializers import OrderSerializer
+from order.viewsets import OrderViewSet
+from product.serializers import ProductSerializer
+from product.viewsets import ProductViewSet
+from supply.generics import renderers
+
+
+def get_pages(page_size):
+    """
+    The product and order list pages, as the serializers and as the values()
+    fast path would build them, for each of the two renderers
+    """
+    products = ProductViewSet()
+    product_values = products.get_values_queryset(products.queryset.order_by("id"))
+    # every confirmed order, rather than just the ones of a single buyer
+    orders = OrderViewSet()
+    order_instances = Order.objects.filter(is_confirmed=True).with_lines().order_by("-id")
+
+    return {
+        "products": {
+            "serializer": lambda: ProductSerializer(products.queryset.order_by("id")[:page_size], many=True).data,
+            "values": lambda: products.serialize_values(product_values[:page_size]),
+        },
+        "orders": {
+            "serializer": lambda: OrderSerializer(order_instances[:page_size], many=True).data,
+            "values": lambda: orders.serialize_values(orders.get_values_queryset(order_instances)[:page_size]),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares building a page of the product and order lists through the serializers with the values() '
+        'fast path, each rendered with the stdlib JSON renderer and the orjson one, and checks that all of '
+        'them give the same bytes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', default=50, type=int)
+        parser.add_argument('--iterations', default=200, type=int)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            print("--- orjson isn't installed, the fast renderer falls back to the stdlib")
+
+        variants = {"json": StdlibJSONRenderer(), "orjson": renderers.JSONRenderer()}
+        for endpoint, builders in get_pages(options['page_size']).items():
+            expected = None
+            timings = {}
+            for builder_name, build in builders.items():
+                for renderer_name, renderer in variants.items():
+                    output = renderer.render(build())
+                    if expected is None:
+                        expected = output
+                    elif output != expected:
+                        raise CommandError(f"{endpoint} with {builder_name} and {renderer_name} gave different output")
+
+                    started = time.perf_counter()
+                    for _ in range(options['iterations']):
+                        renderer.render(build())
+                    timings[f"{builder_name} + {renderer_name}"] = (
+                        (time.perf_counter() - started) / options['iterations'] * 1000
+                    )
+
+            baseline = timings["serializer + json"]
+            print(f"--- {endpoint}, pages of {options['page_size']} ({len(expected)} bytes), including the queries:")
+            for name, ms in timings.items():
+                print(f"---   {name:<20} {ms:>8.2f}ms per page  {baseline / ms:>5.1f}x")
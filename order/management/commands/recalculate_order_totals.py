@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recalculates order totals from their lines, for repairing totals that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Include confirmed orders, by default only open carts are recalculated'
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            orders = orders.filter(is_confirmed=False)
+
+        updated = orders.recalculate_totals()
+
+        print(f"--- Recalculated the totals of {updated} orders")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.models import Allocation
+
+
+class Command(BaseCommand):
+    help = 'Gives the stock of expired cart reservations back to the offers, run this periodically'
+
+    def handle(self, *args, **options):
+        released = Allocation.objects.expired().release()
+        # allocations of lines that have been deleted without holding any stock
+        deleted, _ = Allocation.objects.filter(line=None, expires_at=None).delete()
+
+        print(f"--- Released {released} expired holds and cleaned up {deleted} allocations")
@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-18 18:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_subtotals(apps, schema_editor):
+    OrderLine = apps.get_model('order', 'OrderLine')
+    OrderLine.objects.update(subtotal=F('price') * F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='The price multiplied by the quantity', max_digits=14),
+        ),
+        migrations.RunPython(populate_subtotals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1 on 2026-10-18 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def allocate_existing_lines(apps, schema_editor):
+    """
+    The existing lines were supplied by the offer of their seller
+    """
+    Allocation = apps.get_model('order', 'Allocation')
+    Offer = apps.get_model('product', 'Offer')
+    OrderLine = apps.get_model('order', 'OrderLine')
+
+    offers = {
+        (product_id, seller_id): offer_id
+        for offer_id, product_id, seller_id in Offer.objects.values_list('id', 'product_id', 'seller_id')
+    }
+    lines = OrderLine.objects.values_list('id', 'product_id', 'seller_id', 'quantity')
+    Allocation.objects.bulk_create(
+        (
+            Allocation(
+                line_id=line_id, offer_id=offers[(product_id, seller_id)], seller_id=seller_id, quantity=quantity
+            )
+            for line_id, product_id, seller_id, quantity in lines.iterator()
+            if (product_id, seller_id) in offers
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_offer_allocation_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0002_orderline_subtotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Allocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, help_text='The datetime this was created')),
+                ('date_updated', models.DateTimeField(auto_now=True, help_text='The datetime this was updated')),
+                ('quantity', models.PositiveIntegerField(help_text='How many units are allocated')),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, default=None, help_text='While the stock is held, when it is given back to the offer unless the order has been checked out', null=True)),
+                ('line', models.ForeignKey(help_text='The order line this is allocated to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='allocations', to='order.orderline')),
+                ('offer', models.ForeignKey(help_text='The offer the stock is allocated from, if it still exists', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='allocations', to='product.offer')),
+                ('seller', models.ForeignKey(help_text='The seller of the offer, kept for when the offer has been removed', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(allocate_existing_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.1 on 2026-10-18 18:18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now, Round
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Concurrent requests could create a second cart for a buyer, or a second line
+    for the same product in a cart. These are folded into one before the
+    constraints are added.
+    """
+    Allocation = apps.get_model('order', 'Allocation')
+    Order = apps.get_model('order', 'Order')
+    OrderLine = apps.get_model('order', 'OrderLine')
+
+    merged = set()
+    carts = Order.objects.filter(is_confirmed=False).values('buyer').annotate(count=Count('id'), keep=Max('id'))
+    for duplicate in carts.filter(count__gt=1):
+        others = Order.objects.filter(buyer=duplicate['buyer'], is_confirmed=False).exclude(id=duplicate['keep'])
+        OrderLine.objects.filter(order__in=others).update(order_id=duplicate['keep'])
+        others.delete()
+        merged.add(duplicate['keep'])
+
+    lines = OrderLine.objects.values('order', 'product').annotate(
+        count=Count('id'), keep=Min('id'), total=Sum('quantity')
+    )
+    for duplicate in lines.filter(count__gt=1):
+        others = OrderLine.objects.filter(
+            order=duplicate['order'], product=duplicate['product']
+        ).exclude(id=duplicate['keep'])
+        Allocation.objects.filter(line__in=others).update(line_id=duplicate['keep'])
+        others.delete()
+        OrderLine.objects.filter(id=duplicate['keep']).update(
+            quantity=duplicate['total'], subtotal=F('price') * duplicate['total']
+        )
+        merged.add(duplicate['order'])
+
+    subtotal = Coalesce(
+        Subquery(
+            OrderLine.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+                value=Sum('subtotal')
+            ).values('value')
+        ),
+        Decimal('0.00'),
+        output_field=DecimalField(),
+    )
+    shipping_cost = Decimal('15.00')
+    vat = Round((subtotal + shipping_cost) * Decimal('0.21'), 2, output_field=DecimalField())
+    Order.objects.filter(id__in=merged).update(
+        subtotal=subtotal,
+        shipping_cost=shipping_cost,
+        vat=vat,
+        total=subtotal + shipping_cost + vat,
+        date_updated=Now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_allocation'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['buyer', 'is_confirmed', 'id'], name='order_buyer_history_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_confirmed', False)), fields=('buyer',), name='order_one_open_cart_per_buyer'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='orderline_unique_product'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 18:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_date_confirmed(apps, schema_editor):
+    # the orders haven't changed since they were placed, so this is as close as it gets
+    Order = apps.get_model('order', 'Order')
+    Order.objects.filter(is_confirmed=True).update(date_confirmed=F('date_updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_order_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='date_confirmed',
+            field=models.DateTimeField(blank=True, default=None, help_text='When the order was placed', null=True),
+        ),
+        migrations.RunPython(fill_date_confirmed, migrations.RunPython.noop),
+    ]
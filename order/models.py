@@ -1,8 +1,17 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models, transaction
-from django.utils.functional import cached_property
+from django.db.models import DecimalField, F, OuterRef, Prefetch, Subquery, Sum, prefetch_related_objects
+from django.db.models.functions import Coalesce, Now, Round
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from product.models import Product
+from order.allocation import allocate, get_offers, get_seller_id
+from order.signals import order_confirmed
+from product.models import Offer, Product
+from product.tasks import refresh_aggregates_later
 from supply.generics.mixins import ModelWithDatetime
 
 
@@ -35,16 +44,257 @@ class OrderLine(ModelWithDatetime):
         help_text="The order that this order line relates to",
         related_name="lines"
     )
+    subtotal = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        help_text="The price multiplied by the quantity"
+    )
+
+    class Meta:
+        constraints = [
+            # the cart shows a product once, with the quantity on its line
+            models.UniqueConstraint(fields=["order", "product"], name="orderline_unique_product"),
+        ]
+
+    def calculate_subtotal(self):
+        self.subtotal = (Decimal(self.price) * self.quantity).quantize(Decimal("0.01"))
+        return self.subtotal
+
+    @property
+    def held_quantity(self):
+        """
+        How much stock is currently reserved for this line
+        """
+        return sum(allocation.quantity for allocation in self.allocations.all() if allocation.expires_at)
+
+
+def allocate_lines(lines, offers=None):
+    """
+    Allocates each of the given order lines (their current quantity) from the
+    offers of its product (see order.allocation), replacing any previous
+    allocation. If reservations are enabled the stock is taken off the offers
+    straight away and held until the reservation expires.
+
+    This is done for all of the lines at once, so it takes the same handful of
+    queries however many there are (plus an UPDATE per offer when reserving).
+    `offers` can be passed in when they've already been fetched. Returns the
+    lines there isn't enough stock for, in which case nothing is changed.
+    """
+    lines = sorted(lines, key=lambda line: line.product_id)
+    short_lines = []
+    try:
+        with transaction.atomic():
+            # give back anything that's currently held, so that it can be allocated again
+            Allocation.objects.filter(line__in=[line.pk for line in lines]).discard()
+
+            if offers is None or reservations_enabled():
+                offers = get_offers([line.product_id for line in lines])
+            planned = []
+            for line in lines:
+                allocations = allocate(offers.get(line.product_id, []), line.quantity)
+                if allocations:
+                    planned.append((line, allocations))
+                else:
+                    short_lines.append(line)
+            if short_lines:
+                raise InsufficientStock
+
+            expires_at = None
+            if reservations_enabled():
+                # the lines are in product order, so the offers are always locked in the same order
+                for line, allocations in planned:
+                    if Product(pk=line.product_id).reduce_quantity(
+                        [(offer.id, allocated) for offer, allocated in allocations]
+                    ):
+                        short_lines.append(line)
+                if short_lines:
+                    raise InsufficientStock
+                refresh_aggregates_later([line.product_id for line in lines])
+                expires_at = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+
+            Allocation.objects.bulk_create(
+                Allocation(
+                    line=line, offer=offer, seller_id=offer.seller_id, quantity=allocated, expires_at=expires_at
+                )
+                for line, allocations in planned
+                for offer, allocated in allocations
+            )
+            lines_to_update = []
+            for line, allocations in planned:
+                seller_id = get_seller_id(allocations)
+                if seller_id != line.seller_id:
+                    line.seller_id = seller_id
+                    lines_to_update.append(line)
+            if lines_to_update:
+                OrderLine.objects.bulk_update(lines_to_update, ["seller"])
+    except InsufficientStock:
+        return short_lines
+    return []
+
+
+def reservations_enabled():
+    return settings.CART_RESERVATIONS
+
+
+class AllocationQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+    def release(self):
+        """
+        Gives the stock held by these allocations back to the offers, all in a
+        handful of queries however many there are. Allocations that are locked by
+        a checkout at the time are skipped, and ones whose line has since been
+        deleted are cleaned up.
+        """
+        with transaction.atomic():
+            allocation_ids = list(
+                self.filter(expires_at__isnull=False).select_for_update(skip_locked=True).values_list("id", flat=True)
+            )
+            if not allocation_ids:
+                return 0
+            held = Allocation.objects.filter(id__in=allocation_ids)
+            product_ids = set(held.exclude(offer=None).values_list("offer__product_id", flat=True))
+            Offer.objects.filter(id__in=held.values("offer_id")).update(
+                quantity=F("quantity") + Subquery(
+                    held.filter(offer=OuterRef("pk")).order_by().values("offer").annotate(
+                        total=Sum("quantity")
+                    ).values("total")
+                )
+            )
+            held.update(expires_at=None)
+            held.filter(line=None).delete()
+            refresh_aggregates_later(product_ids)
+        return len(allocation_ids)
+
+    def discard(self):
+        """
+        Releases any stock held by these allocations and deletes them, i.e when
+        their line is removed or allocated again
+        """
+        with transaction.atomic():
+            # wait for anyone else (i.e a checkout) to be done with them first, so that
+            # none of them are skipped by release()
+            list(self.select_for_update().values_list("id", flat=True))
+            self.release()
+            return self.delete()
+
+
+class Allocation(ModelWithDatetime):
+    """
+    How much of an order line is supplied by which offer. A line can be split
+    over several offers when no single seller has enough stock.
+
+    When reservations are enabled the stock is taken off the offer as soon as
+    it's allocated and held until `expires_at`, so it no longer counts towards
+    the available quantity. Otherwise the stock is only taken at checkout.
+    """
+    line = models.ForeignKey(
+        to="order.OrderLine",
+        # allocations outlive their line so that any held stock is still given back when it expires
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="allocations",
+        help_text="The order line this is allocated to"
+    )
+    offer = models.ForeignKey(
+        to="product.Offer",
+        # the sales of an offer are still needed once it's gone, i.e for the exports and reports
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="allocations",
+        help_text="The offer the stock is allocated from, if it still exists"
+    )
+    seller = models.ForeignKey(
+        to="user.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text="The seller of the offer, kept for when the offer has been removed"
+    )
+    quantity = models.PositiveIntegerField(
+        help_text="How many units are allocated"
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        default=None,
+        null=True,
+        blank=True,
+        help_text="While the stock is held, when it is given back to the offer unless the order has been checked out"
+    )
+
+    objects = AllocationQuerySet.as_manager()
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def get_lines_prefetch():
+    # the serializers touch the product (and its price) of every line, so they're
+    # fetched along with the lines rather than one query per line
+    return Prefetch("lines", queryset=OrderLine.objects.select_related("product").order_by("id"))
+
+
+VAT_RATE = Decimal("0.21")  # assume constant VAT for this exercise, usually would come from buyer location
+SHIPPING_COST = Decimal("15.00")  # assume flat shipping cost for this exercise
+TOTAL_FIELDS = ["subtotal", "shipping_cost", "vat", "total", "date_updated"]
+
+
+def get_totals(subtotal):
+    """
+    The expressions to update the order totals with, given an expression for the
+    new subtotal
+    """
+    vat = Round((subtotal + SHIPPING_COST) * VAT_RATE, 2, output_field=DecimalField())
+    return {
+        "subtotal": subtotal,
+        "shipping_cost": SHIPPING_COST,
+        "vat": vat,
+        "total": subtotal + SHIPPING_COST + vat,
+        "date_updated": Now(),
+    }
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_lines(self):
+        return self.prefetch_related(get_lines_prefetch())
 
-    @cached_property
-    def subtotal(self):
-        return round(float(self.price) * self.quantity, 2)
+    def recalculate_totals(self):
+        """
+        Recalculates the totals of every order in this queryset from their lines,
+        in a single UPDATE. Day to day the totals are kept up to date incrementally
+        with Order.apply_subtotal_change, this is for repairing them.
+        """
+        subtotal = Coalesce(
+            Subquery(
+                OrderLine.objects.filter(order=OuterRef("pk")).order_by().values("order").annotate(
+                    value=Sum("subtotal")
+                ).values("value")
+            ),
+            Decimal("0.00"),
+            output_field=DecimalField(),
+        )
+        return self.update(**get_totals(subtotal))
 
 
-class OrderManager(models.Manager):
+class OrderManager(models.Manager.from_queryset(OrderQuerySet)):
     def get_or_create_open_order_for_user(self, user):
+        # if two requests create the cart at the same time, the unique constraint
+        # makes one of them fail and get_or_create then fetches the other's cart
         return self.get_or_create(buyer=user, is_confirmed=False)
 
+    async def aget_or_create_open_order_for_user_with_lines(self, user):
+        """
+        The open cart with its lines prefetched, so that it can be serialized
+        without querying from an async view
+        """
+        cart, created = await self.with_lines().aget_or_create(buyer=user, is_confirmed=False)
+        if created:
+            # a brand new cart has no lines, but they still need to be "prefetched"
+            cart = await self.with_lines().aget(pk=cart.pk)
+        return cart, created
+
 
 class Order(ModelWithDatetime):
     """
@@ -85,67 +335,172 @@ class Order(ModelWithDatetime):
         default=False,
         help_text="Whether or not this order has been placed or is still pending"
     )
+    date_confirmed = models.DateTimeField(
+        default=None,
+        null=True,
+        blank=True,
+        help_text="When the order was placed"
+    )
 
     objects = OrderManager()
 
-    def calculate_totals(self):
-        vat_amount = 0.21  # assume constant VAT for this exercise, usually would come from buyer location
-        shipping_cost = 15.00  # assume flat shipping cost for this exercise
+    class Meta:
+        constraints = [
+            # a buyer only has one cart, which get_or_create_open_order_for_user relies on
+            models.UniqueConstraint(
+                fields=["buyer"], condition=models.Q(is_confirmed=False), name="order_one_open_cart_per_buyer"
+            ),
+        ]
+        indexes = [
+            # the order history of a buyer, newest first
+            models.Index(fields=["buyer", "is_confirmed", "id"], name="order_buyer_history_idx"),
+        ]
 
-        items = self.lines.values("price", "quantity")
-        self.subtotal = float(sum((item["price"] * item["quantity"]) for item in items))
-        self.shipping_cost = shipping_cost
-        self.vat = (self.subtotal + self.shipping_cost) * vat_amount
-        self.total = self.subtotal + self.shipping_cost + self.vat
-        self.save(update_fields=["subtotal", "shipping_cost", "vat", "total"])
+    def lock(self):
+        """
+        Locks the cart until the end of the transaction, so that changes to it are
+        made one after the other instead of racing each other (i.e to add a line
+        for the same product). Raises if it has been checked out in the meantime.
+        """
+        if not Order.objects.select_for_update().filter(pk=self.pk, is_confirmed=False).exists():
+            raise ValidationError("This order has already been checked out.")
+
+    def with_lines(self):
+        """
+        Loads the lines and their products in one go, ready for serializing
+        """
+        prefetch_related_objects([self], get_lines_prefetch())
+        return self
+
+    def apply_subtotal_change(self, amount):
+        """
+        Adds `amount` (the change in the line subtotals) to the order totals, rather
+        than summing up every line again. This happens in the database so that
+        concurrent changes to the same cart don't overwrite each other.
+        """
+        Order.objects.filter(pk=self.pk).update(**get_totals(F("subtotal") + amount))
+        self.refresh_from_db(fields=TOTAL_FIELDS)
+
+    def recalculate_totals(self):
+        Order.objects.filter(pk=self.pk).recalculate_totals()
+        self.refresh_from_db(fields=TOTAL_FIELDS)
 
     def checkout(self):
         """
-        1. Get list of items in cart
-        2. Get matching products
-        3. Compare quantities -- make sure it hasn't sold out since adding to cart
-        4. If it has sold out, appropriately remove the items or update the quantities
+        1. Lock the cart, so that it can't be checked out twice at the same time
+        2. Take the stock for every line from the offers it was allocated from, with
+           conditional UPDATEs so that the stock can never be oversold without having
+           to lock the offers up front. Stock that is still reserved for the cart has
+           already been taken
+        3. If any offer no longer has enough stock, undo all of the above and update
+           the quantities in the cart to what is still available
+        4. Otherwise freeze the current prices on the lines and confirm the order,
+           sending order_confirmed (which adds it to the sales reports)
+
+        The offers are always updated in the same order (by product, then offer) so
+        that concurrent checkouts of overlapping carts lock them in the same order
+        and can't deadlock each other.
 
         This can be better refined, probably moved elsewhere with clearer messaging on
         what has changed. Maybe even put the out-of-stock items into a wishlist or
         something to notify them about when its back in stock.
         """
-        order_lines = self.lines.all().select_related("product")
-        products = Product.objects.select_for_update().filter(
-            id__in=order_lines.values_list("product_id")
-        )
         with transaction.atomic():
-            existing_orderlines_to_update = []
-            existing_orderlines_to_delete = []
-            for item in products:
-                matching_order_line = order_lines.get(product_id=item.id)
-                if item.quantity >= matching_order_line.quantity:
-                    item.reduce_quantity(matching_order_line.quantity)
-                elif item.quantity > 0:
-                    matching_order_line.quantity = item.quantity
-                    existing_orderlines_to_update.append(matching_order_line)
-                elif item.quantity == 0:
-                    existing_orderlines_to_delete.append(matching_order_line.id)
-
-            if existing_orderlines_to_update:
-                OrderLine.objects.bulk_update(existing_orderlines_to_update, ["quantity"])
-            if existing_orderlines_to_delete:
-                OrderLine.objects.filter(id__in=existing_orderlines_to_delete).delete()
-
-        if existing_orderlines_to_update or existing_orderlines_to_delete:
-            self.calculate_totals()
+            self.lock()
+
+            order_lines = list(self.lines.select_related("product").order_by("product_id", "id"))
+            # stock that's still held has already been taken off the offers, the allocations
+            # are locked so that they can't be released while we're checking out
+            allocations = list(
+                Allocation.objects.select_for_update(of=("self",)).filter(line__order=self).order_by("offer_id")
+            )
+            allocated_line_ids = {allocation.line_id for allocation in allocations}
+            to_take = {}
+            for allocation in allocations:
+                if allocation.offer_id is None:
+                    # the offer has been removed since, so the line has to be allocated again
+                    allocated_line_ids.discard(allocation.line_id)
+                elif not allocation.expires_at:
+                    to_take.setdefault(allocation.line_id, []).append((allocation.offer_id, allocation.quantity))
+
+            short_lines = []
+            try:
+                with transaction.atomic():
+                    for line in order_lines:
+                        if line.id not in allocated_line_ids or line.product.price is None:
+                            # nothing to take the stock from, or no price to sell it at (the product
+                            # has no offers left), this gets it allocated again or removed below
+                            short_lines.append(line)
+                        elif line.id in to_take and line.product.reduce_quantity(to_take[line.id]):
+                            short_lines.append(line)
+                    if short_lines:
+                        # roll back the stock that was taken for the other lines
+                        raise InsufficientStock
+            except InsufficientStock:
+                self._reduce_to_available_stock(short_lines, allocations)
+                self.recalculate_totals()
+
+            if not short_lines:
+                for line in order_lines:
+                    line.price = line.product.price
+                    line.calculate_subtotal()
+                OrderLine.objects.bulk_update(order_lines, ["price", "subtotal"])
+                self.recalculate_totals()
+                refresh_aggregates_later([line.product_id for line in order_lines if line.id in to_take])
+
+                # the held stock has now been sold
+                Allocation.objects.filter(id__in=[allocation.id for allocation in allocations]).update(
+                    expires_at=None
+                )
+
+                self.is_confirmed = True
+                self.date_confirmed = timezone.now()
+                self.save(update_fields=["is_confirmed", "date_confirmed", "date_updated"])
+                order_confirmed.send(sender=Order, order=self)
+
+        if short_lines:
             raise ValidationError(
                 "Some of your chosen items have since become out of stock or no longer have sufficient "
                 "quantity. Please review your updated cart."
             )
-        # if the product price was a database field i could do something like the below:
-        # order_lines.update(price=F("product__price"))
-        #
-        # but because for this exercise it's not, and i don't have time to refactor, i
-        # have to do the more expensive/uglier code below
-        for item in order_lines:
-            item.price = item.product.price
-            item.save()
-
-        self.is_confirmed = True
-        self.save(update_fields=["is_confirmed"])
+
+    def _reduce_to_available_stock(self, order_lines, allocations):
+        """
+        Brings the quantity of each of the given lines down to what is still
+        available (plus whatever is held for it, out of `allocations`) and
+        allocates them again all at once, removing the lines that are sold out or
+        whose product has no price
+        """
+        held = {}
+        for allocation in allocations:
+            if allocation.expires_at and allocation.offer_id:
+                held[allocation.line_id] = held.get(allocation.line_id, 0) + allocation.quantity
+        available = dict(
+            Offer.objects.filter(
+                product_id__in=[line.product_id for line in order_lines]
+            ).order_by().values("product_id").annotate(total=Sum("quantity")).values_list("product_id", "total")
+        )
+
+        lines_to_update = []
+        lines_to_delete = []
+        for line in order_lines:
+            line.quantity = min(line.quantity, available.get(line.product_id, 0) + held.get(line.id, 0))
+            if line.quantity > 0 and line.product.price is not None:
+                line.calculate_subtotal()
+                lines_to_update.append(line)
+            else:
+                lines_to_delete.append(line.id)
+
+        # the stock can still be taken by someone else in the meantime, in which case
+        # those lines are given up on as well
+        short_lines = allocate_lines(lines_to_update)
+        while short_lines:
+            lines_to_delete += [line.id for line in short_lines]
+            lines_to_update = [line for line in lines_to_update if line not in short_lines]
+            short_lines = allocate_lines(lines_to_update)
+
+        if lines_to_update:
+            OrderLine.objects.bulk_update(lines_to_update, ["quantity", "subtotal"])
+        if lines_to_delete:
+            Allocation.objects.filter(line_id__in=lines_to_delete).discard()
+            OrderLine.objects.filter(id__in=lines_to_delete).delete()
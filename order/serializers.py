@@ -1,7 +1,10 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from order.models import OrderLine
+from order.allocation import allocate, get_offers, get_seller_id
+from order.models import Allocation, OrderLine, allocate_lines
 from product.models import Product
 
 
@@ -66,6 +69,117 @@ class OrderSerializer(serializers.Serializer):
     )
 
 
+def held(line):
+    return line.held_quantity if line else 0
+
+
+def available(offers, line):
+    """
+    How much of a product can go on a line: the stock of its offers (as
+    returned by get_offers) plus whatever is already held for the line. This is
+    what the line is actually allocated from, so it's used rather than the
+    stored quantity on the product, which can be behind the offers.
+    """
+    return sum(offer.quantity for offer in offers) + held(line)
+
+
+def get_new_line(cart, product, quantity, offers):
+    """
+    A new line for `product`, from offers that are known to have enough stock
+    for it. allocate_lines picks the same seller, so it doesn't have to change it.
+    """
+    line = OrderLine(
+        seller_id=get_seller_id(allocate(offers, quantity)),
+        order=cart,
+        product=product,
+        price=product.price,
+        quantity=quantity
+    )
+    line.calculate_subtotal()
+    return line
+
+
+class AddToCartListSerializer(serializers.ListSerializer):
+    def add(self, cart, items):
+        """
+        Applies a whole list of cart changes at once: the stock for every product is
+        checked in one query, the lines are written and allocated with bulk operations
+        and the totals are only recalculated at the end. Nothing is applied if any item
+        is invalid, and the errors are reported against each item.
+        """
+        product_ids = [item["id"] for item in items]
+        products = Product.objects.in_bulk(product_ids)
+        existing_lines = {
+            line.product_id: line for line in cart.lines.prefetch_related("allocations").filter(product_id__in=product_ids)
+        }
+        # the offers for every product are fetched in one go, see order.allocation
+        offers = get_offers(product_ids)
+
+        errors = []
+        seen = set()
+        for item in items:
+            product = products.get(item["id"])
+            maximum = available(offers.get(item["id"], []), existing_lines.get(item["id"]))
+            if item["id"] in seen:
+                errors.append({"id": f"Product with ID {item['id']} appears more than once."})
+            elif not product:
+                errors.append({"id": f"Product with ID {item['id']} does not exist."})
+            elif item["quantity"] == 0 and item["id"] not in existing_lines:
+                errors.append({"quantity": "Invalid quantity. Quantity must be at least 1"})
+            elif item["quantity"] > maximum:
+                errors.append({
+                    "quantity": f"Requested quantity of product {product.name} exceeds stock levels, maximum "
+                                f"quantity is {maximum}."
+                })
+            else:
+                errors.append({})
+            seen.add(item["id"])
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        lines_to_add = []
+        lines_to_update = []
+        lines_to_delete = []
+        subtotal_change = 0
+        for item in items:
+            line = existing_lines.get(item["id"])
+            if not line:
+                line = get_new_line(cart, products[item["id"]], item["quantity"], offers[item["id"]])
+                subtotal_change += line.subtotal
+                lines_to_add.append(line)
+            elif item["quantity"] == 0:
+                subtotal_change -= line.subtotal
+                lines_to_delete.append(line.id)
+            else:
+                subtotal_change -= line.subtotal
+                line.quantity = item["quantity"]
+                subtotal_change += line.calculate_subtotal()
+                lines_to_update.append(line)
+
+        with transaction.atomic():
+            if lines_to_add:
+                OrderLine.objects.bulk_create(lines_to_add)
+            if lines_to_update:
+                OrderLine.objects.bulk_update(lines_to_update, ["quantity", "subtotal"])
+            if lines_to_delete:
+                Allocation.objects.filter(line_id__in=lines_to_delete).discard()
+                OrderLine.objects.filter(id__in=lines_to_delete).delete()
+
+            short_lines = allocate_lines(lines_to_add + lines_to_update, offers)
+            if short_lines:
+                short_product_ids = {line.product_id for line in short_lines}
+                raise ValidationError([
+                    {
+                        "quantity": f"Requested quantity of product {products[item['id']].name} exceeds "
+                                    f"stock levels."
+                    } if item["id"] in short_product_ids else {}
+                    for item in items
+                ])
+            cart.apply_subtotal_change(subtotal_change)
+        return cart
+
+
 class AddToCartSerializer(serializers.Serializer):
     id = serializers.IntegerField(
         help_text="The primary key of the product"  # In practice this might be a UUID or a hashed version of the PK
@@ -75,63 +189,96 @@ class AddToCartSerializer(serializers.Serializer):
         min_value=0,
     )
 
+    class Meta:
+        list_serializer_class = AddToCartListSerializer
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # every item in the list is validated and written in the same request
+        kwargs.setdefault("max_length", settings.CART_UPDATE_LIMIT)
+        return super().many_init(*args, **kwargs)
+
     def add(self, cart, item):
         """
         This can probably come out of the serializer and live elsewhere, I had
         different plans initially so put it here but as it matured it stopped
         making as much sense.
         """
-        existing_item = cart.lines.filter(product_id=item["id"])
-        lines_to_add = []
+        existing_item = cart.lines.prefetch_related("allocations").filter(product_id=item["id"]).first()
         try:
             product = Product.objects.get(id=item["id"])
         except Product.DoesNotExist:
             raise ValidationError({"id": f"Product with ID {item['id']} does not exist."})
+        # the sellers are chosen by order.allocation from these
+        offers = get_offers([product.id]).get(product.id, [])
 
         if existing_item:
+            previous_subtotal = existing_item.subtotal
+            # whatever is already held for this line isn't counted as available any more
+            maximum = available(offers, existing_item)
             if item["quantity"] == 0:
-                existing_item.delete()
-            elif item["quantity"] <= product.quantity:
-                existing_item.update(quantity=item["quantity"])
-            elif item["quantity"] > product.quantity:
+                with transaction.atomic():
+                    existing_item.allocations.all().discard()
+                    existing_item.delete()
+                    cart.apply_subtotal_change(-previous_subtotal)
+            elif item["quantity"] <= maximum:
+                with transaction.atomic():
+                    existing_item.quantity = item["quantity"]
+                    if allocate_lines([existing_item], {product.id: offers}):
+                        raise ValidationError({
+                            "quantity": f"Requested quantity of product {product.name} exceeds stock levels."
+                        })
+                    existing_item.calculate_subtotal()
+                    existing_item.save(update_fields=["quantity", "subtotal", "date_updated"])
+                    cart.apply_subtotal_change(existing_item.subtotal - previous_subtotal)
+            elif item["quantity"] > maximum:
                 raise ValidationError({
                     "quantity": f"Requested quantity of product {product.name} exceeds stock levels, maximum "
-                                f"quantity is {product.quantity}."
+                                f"quantity is {maximum}."
                 })
-            cart.calculate_totals()
             return cart
 
+        maximum = available(offers, None)
         if item["quantity"] == 0:
             raise ValidationError({"quantity": "Invalid quantity. Quantity must be at least 1"})
-        elif item["quantity"] > product.quantity:
+        elif item["quantity"] > maximum:
             raise ValidationError(
                 {
                     "quantity": f"Requested quantity of product {product.name} exceeds stock levels, maximum "
-                                f"quantity is {product.quantity}"
+                                f"quantity is {maximum}"
                 }
             )
-        """
-        choose the offer at random. in practice this should be a whole microservice or something that
-        1. takes into account historical seller performance to fulfill the order
-        2. considers geographical proximity
-        3. takes pricing into consideration
-        4. takes MOQ amounts into consideration
-        5. considers historical quality of the supplied product
-        6. various other heuristics passed off to some ML megamind
-        7. can split this across multiple sellers who offer different amounts
-        """
-        seller = product.offers.order_by("?").first().seller.id
-        # add some handling to ensure that the item with that id actually exists
-        lines_to_add.append(
-            OrderLine(
-                seller_id=seller,
-                order=cart,
-                product=product,
-                price=product.price,
-                quantity=item["quantity"]
-            )
-        )
+        line = get_new_line(cart, product, item["quantity"], offers)
+
+        with transaction.atomic():
+            line.save()
+            if allocate_lines([line], {product.id: offers}):
+                raise ValidationError({
+                    "quantity": f"Requested quantity of product {product.name} exceeds stock levels."
+                })
+            cart.apply_subtotal_change(line.subtotal)
+        return cart
+
+
+class OrderExportSerializer(serializers.Serializer):
+    """
+    The query parameters of the order export, see order.export
+    """
+    role = serializers.ChoiceField(
+        choices=["buyer", "seller"],
+        default="buyer",
+        help_text="Export the orders placed as the buyer, or the order lines supplied as the seller",
+    )
+    date_from = serializers.DateField(
+        required=False,
+        help_text="Only orders created on or after this date",
+    )
+    date_to = serializers.DateField(
+        required=False,
+        help_text="Only orders created on or before this date",
+    )
 
-        OrderLine.objects.bulk_create(lines_to_add)
-        cart.calculate_totals()
-        return cart
\ No newline at end of file
+    def validate(self, attrs):
+        if attrs.get("date_from") and attrs.get("date_to") and attrs["date_from"] > attrs["date_to"]:
+            raise ValidationError("date_from can't be after date_to.")
+        return attrs
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# sent by Order.checkout with the `order` that has just been placed, inside the
+# checkout transaction. Anything that has to happen along with the order (i.e
+# report.signals) can hook in here, the rest can queue a job (see job.queue)
+order_confirmed = Signal()
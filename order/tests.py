@@ -0,0 +1,458 @@
+from decimal import Decimal
+
+import csv
+import io
+import json
+import threading
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from order.models import Allocation, Order, OrderLine
+from product.factories import OfferFactory
+from product.models import Offer, Product
+from user.factories import UserFactory
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class OrderQueryCountTests(APITestCase):
+    """
+    The order endpoints should take the same number of queries however many
+    orders and lines there are, rather than a few more for each of them
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.products = []
+        pricier_offer_ids = []
+        for _ in range(10):
+            offer = OfferFactory(quantity=100)
+            # a second, pricier offer that a line can be split over
+            pricier_offer_ids.append(
+                OfferFactory(product=offer.product, quantity=100, seller_price=offer.seller_price + 1).id
+            )
+            cls.products.append(offer.product)
+        cls.pricier_offers = Offer.objects.filter(id__in=pricier_offer_ids)
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+
+    def fill_cart(self, line_count, quantity=1):
+        response = self.client.post(
+            "/api/orders/update_cart/",
+            [{"id": product.id, "quantity": quantity} for product in self.products[:line_count]],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def place_orders(self, order_count, line_count):
+        for _ in range(order_count):
+            self.fill_cart(line_count)
+            self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+
+    def test_list(self):
+        self.place_orders(1, 1)
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/orders/")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.place_orders(4, 5)
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/orders/")
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_cart(self):
+        self.fill_cart(1)
+        with self.assertNumQueries(3):
+            self.client.get("/api/orders/cart/")
+
+        self.fill_cart(10)
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/orders/cart/")
+        self.assertEqual(len(response.data["lines"]), 10)
+
+    def test_update_cart_adds_lines(self):
+        with self.assertNumQueries(26):
+            self.fill_cart(1)
+
+        Order.objects.all().delete()
+        with self.assertNumQueries(26):
+            self.fill_cart(10)
+
+    def test_update_cart_changes_lines(self):
+        self.fill_cart(1)
+        # more than the cheapest offer has, so the lines are split over both
+        with self.assertNumQueries(24):
+            self.fill_cart(1, quantity=150)
+
+        self.fill_cart(10)
+        with self.assertNumQueries(24):
+            self.fill_cart(10, quantity=150)
+
+    def test_checkout(self):
+        # the stock is taken from every offer with a conditional UPDATE of its own (see
+        # Order.checkout), everything else takes the same queries however many lines there are
+        self.fill_cart(1, quantity=150)
+        with self.assertNumQueries(19 + 2):
+            self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+
+        self.fill_cart(10, quantity=50)
+        with self.assertNumQueries(19 + 10):
+            self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).available_quantity, 0)
+
+    def test_checkout_short_lines(self):
+        # the pricier offers sell out in the meantime, so the lines are brought down to
+        # what the cheapest ones still have and allocated again, all in one go. As above,
+        # only the conditional UPDATEs (one per offer) add up with the lines
+        for line_count, queries in [(1, 24 + 2), (10, 24 + 20)]:
+            self.pricier_offers.update(quantity=100)
+            self.fill_cart(line_count, quantity=150)
+            self.pricier_offers.update(quantity=0)
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 400)
+            response = self.client.get("/api/orders/cart/")
+            self.assertEqual([line["quantity"] for line in response.data["lines"]], [100] * line_count)
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class CheckoutTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.offer = OfferFactory(quantity=10)
+        cls.product = cls.offer.product
+        cls.product.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+        response = self.client.post("/api/orders/update_cart/", {"id": self.product.id, "quantity": 4}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.cart = Order.objects.get(buyer=self.buyer, is_confirmed=False)
+
+    def checkout(self):
+        return self.client.post("/api/orders/checkout/")
+
+    def test_checkout(self):
+        self.assertEqual(self.checkout().status_code, 200)
+        self.cart.refresh_from_db()
+        self.assertTrue(self.cart.is_confirmed)
+        line = self.cart.lines.get()
+        self.assertEqual((line.quantity, line.price), (4, self.product.price))
+        self.assertEqual(Offer.objects.get(pk=self.offer.pk).quantity, 6)
+
+    def test_line_without_a_price(self):
+        # i.e its offers were removed since, and the product has been refreshed
+        Product.objects.filter(pk=self.product.pk).update(price=None)
+        self.assertEqual(self.checkout().status_code, 400)
+        self.cart.refresh_from_db()
+        self.assertFalse(self.cart.is_confirmed)
+        self.assertFalse(self.cart.lines.exists())
+        self.assertEqual(Offer.objects.get(pk=self.offer.pk).quantity, 10)
+
+    def test_line_without_an_allocation(self):
+        Allocation.objects.all().delete()
+        self.assertEqual(self.checkout().status_code, 400)
+        # the line is allocated again, so the cart can be checked out as it is
+        line = self.cart.lines.get()
+        self.assertEqual(line.allocations.get().offer_id, self.offer.id)
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(Offer.objects.get(pk=self.offer.pk).quantity, 6)
+
+    def test_offer_removed(self):
+        other_offer = OfferFactory(product=self.product, quantity=10)
+        self.offer.delete()
+        self.assertEqual(self.checkout().status_code, 400)
+        # the line is allocated again, from the offer that is left
+        line = self.cart.lines.get()
+        self.assertEqual(line.allocations.get().offer_id, other_offer.id)
+        self.assertEqual(self.checkout().status_code, 200)
+
+        # what was sold is kept when an offer goes
+        other_offer.delete()
+        allocation = line.allocations.get()
+        self.assertEqual((allocation.offer_id, allocation.seller_id), (None, other_offer.seller_id))
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_no_overselling(self):
+        offer = OfferFactory(quantity=5)
+        offer.product.refresh_aggregates()
+        clients = []
+        for _ in range(10):
+            client = APIClient()
+            client.force_authenticate(UserFactory())
+            # there's no reservation, so every cart can have the last units in it
+            response = client.post("/api/orders/update_cart/", {"id": offer.product_id, "quantity": 1}, format="json")
+            self.assertEqual(response.status_code, 200)
+            clients.append(client)
+
+        start = threading.Barrier(len(clients))
+        status_codes = []
+
+        def checkout(client):
+            try:
+                start.wait()
+                status_codes.append(client.post("/api/orders/checkout/").status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(status_codes), [200] * 5 + [400] * 5)
+        offer.refresh_from_db()
+        self.assertEqual(offer.quantity, 0)
+        sold = OrderLine.objects.filter(order__is_confirmed=True).values_list("quantity", flat=True)
+        self.assertEqual(list(sold), [1] * 5)
+        # the carts that missed out are emptied, as there's nothing left
+        self.assertFalse(OrderLine.objects.filter(order__is_confirmed=False).exists())
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class UpdateCartTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.offers = [OfferFactory(quantity=10) for _ in range(3)]
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+
+    def update_cart(self, items):
+        return self.client.post("/api/orders/update_cart/", items, format="json")
+
+    def get_cart(self):
+        return {line["productId"]: line["quantity"] for line in self.client.get("/api/orders/cart/").data["lines"]}
+
+    def test_list(self):
+        first, second, third = [offer.product_id for offer in self.offers]
+        self.update_cart([{"id": first, "quantity": 2}, {"id": second, "quantity": 3}])
+        self.assertEqual(self.get_cart(), {first: 2, second: 3})
+
+        # changes, removes and adds lines all at once
+        response = self.update_cart([
+            {"id": first, "quantity": 5}, {"id": second, "quantity": 0}, {"id": third, "quantity": 10},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_cart(), {first: 5, third: 10})
+        cart = Order.objects.get(buyer=self.buyer, is_confirmed=False)
+        self.assertEqual(cart.subtotal, sum(line.subtotal for line in cart.lines.all()))
+
+    def test_list_errors(self):
+        first, second, third = [offer.product_id for offer in self.offers]
+        self.update_cart([{"id": first, "quantity": 2}])
+
+        response = self.update_cart([
+            {"id": first, "quantity": 4},
+            {"id": 0, "quantity": 1},
+            {"id": second, "quantity": 11},
+            {"id": first, "quantity": 1},
+            {"id": third, "quantity": 0},
+        ])
+        self.assertEqual(response.status_code, 400)
+        # an error for every item that has one, in the order they were sent
+        self.assertEqual([set(error) for error in response.data], [set(), {"id"}, {"quantity"}, {"id"}, {"quantity"}])
+        self.assertIn("maximum quantity is 10", response.data[2]["quantity"])
+        # and nothing is applied, not even the valid items
+        self.assertEqual(self.get_cart(), {first: 2})
+
+    @override_settings(CART_UPDATE_LIMIT=2)
+    def test_too_many_items(self):
+        items = [{"id": offer.product_id, "quantity": 1} for offer in self.offers]
+        response = self.update_cart(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["non_field_errors"][0].code, "max_length")
+        self.assertEqual(self.get_cart(), {})
+
+        self.assertEqual(self.update_cart(items[:2]).status_code, 200)
+        self.assertEqual(self.get_cart(), {offer.product_id: 1 for offer in self.offers[:2]})
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class OrderListTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.offers = [OfferFactory(quantity=10, seller_price=Decimal("10.00")) for _ in range(2)]
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+
+    def place_order(self, items):
+        self.assertEqual(self.client.post("/api/orders/update_cart/", items, format="json").status_code, 200)
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+
+    def test_list(self):
+        first, second = [offer.product for offer in self.offers]
+        self.place_order([{"id": first.id, "quantity": 2}])
+        self.place_order([{"id": first.id, "quantity": 1}, {"id": second.id, "quantity": 3}])
+        # still in the cart, so not an order yet
+        self.client.post("/api/orders/update_cart/", {"id": second.id, "quantity": 1}, format="json")
+        # the orders show the prices they were placed at
+        Product.objects.filter(pk=first.pk).update(price=Decimal("99.00"))
+
+        response = self.client.get("/api/orders/")
+        self.assertEqual(response.status_code, 200)
+        newest, oldest = response.data["results"]
+        self.assertEqual(
+            [(line["productId"], line["product"], line["quantity"], line["price"], line["subtotal"])
+             for line in newest["lines"]],
+            [
+                (first.id, first.name, 1, Decimal("11.20"), "11.20"),
+                (second.id, second.name, 3, Decimal("11.20"), "33.60"),
+            ],
+        )
+        self.assertEqual(
+            (newest["subtotal"], newest["shipping_cost"], newest["vat"], newest["total"], newest["is_confirmed"]),
+            ("44.80", "15.00", "12.56", "72.36", True),
+        )
+        self.assertEqual([line["quantity"] for line in oldest["lines"]], [2])
+
+        # nobody else sees them
+        self.client.force_authenticate(UserFactory())
+        self.assertEqual(self.client.get("/api/orders/").data["results"], [])
+
+
+@override_settings(CART_RESERVATIONS=True, DEFERRED_AGGREGATES=False)
+class ReservationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.offer = OfferFactory(quantity=10)
+        cls.product = cls.offer.product
+        cls.product.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+
+    def update_cart(self, quantity, client=None):
+        return (client or self.client).post(
+            "/api/orders/update_cart/", {"id": self.product.id, "quantity": quantity}, format="json"
+        )
+
+    def assert_stock(self, quantity):
+        self.assertEqual(Offer.objects.get(pk=self.offer.pk).quantity, quantity)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).available_quantity, quantity)
+
+    def release_expired_holds(self):
+        with redirect_stdout(io.StringIO()):
+            call_command("release_expired_holds")
+
+    def test_held_while_in_the_cart(self):
+        self.assertEqual(self.update_cart(4).status_code, 200)
+        self.assert_stock(6)
+        allocation = Allocation.objects.get()
+        expected_expiry = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+        self.assertAlmostEqual(allocation.expires_at, expected_expiry, delta=timedelta(seconds=5))
+
+        # nobody else can have the held stock
+        other = APIClient()
+        other.force_authenticate(UserFactory())
+        self.assertEqual(self.update_cart(7, client=other).status_code, 400)
+        self.assertEqual(self.update_cart(6, client=other).status_code, 200)
+        self.assert_stock(0)
+
+        # the buyer can still change their own line with what's held for it
+        self.assertEqual(self.update_cart(3).status_code, 200)
+        self.assert_stock(1)
+        self.assertEqual(self.update_cart(0).status_code, 200)
+        self.assert_stock(4)
+
+    def test_checkout(self):
+        self.update_cart(4)
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+        # the held stock isn't taken a second time, and it's sold rather than held now
+        self.assert_stock(6)
+        self.assertIsNone(Allocation.objects.get().expires_at)
+        self.release_expired_holds()
+        self.assert_stock(6)
+
+    def test_expired(self):
+        self.update_cart(4)
+        self.release_expired_holds()
+        self.assert_stock(6)
+
+        Allocation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.release_expired_holds()
+        self.assert_stock(10)
+        # the line is still in the cart, its stock is taken at checkout instead
+        allocation = Allocation.objects.get()
+        self.assertEqual((allocation.quantity, allocation.expires_at), (4, None))
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+        self.assert_stock(6)
+
+    def test_expired_and_sold_to_someone_else(self):
+        self.update_cart(4)
+        Allocation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.release_expired_holds()
+        other = APIClient()
+        other.force_authenticate(UserFactory())
+        self.update_cart(8, client=other)
+        self.assertEqual(other.post("/api/orders/checkout/").status_code, 200)
+
+        # there's only 2 left, which is what the cart is brought down to (and held again)
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 400)
+        self.assertEqual(self.client.get("/api/orders/cart/").data["lines"][0]["quantity"], 2)
+        self.assert_stock(0)
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+        self.assert_stock(0)
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class ExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.cheap = OfferFactory(quantity=3, seller_price=Decimal("10.00"))
+        cls.product = cls.cheap.product
+        cls.pricier = OfferFactory(product=cls.product, quantity=10, seller_price=Decimal("20.00"))
+        cls.product.refresh_aggregates()
+
+    def setUp(self):
+        # the line is split over both offers, 3 from the cheap one and 2 from the other
+        self.client.force_authenticate(self.buyer)
+        self.client.post("/api/orders/update_cart/", {"id": self.product.id, "quantity": 5}, format="json")
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+
+    def export(self, user, query=""):
+        self.client.force_authenticate(user)
+        response = self.client.get(f"/api/orders/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_buyer(self):
+        (row,) = [json.loads(line) for line in self.export(self.buyer).splitlines()]
+        self.assertEqual(
+            (row["product_id"], row["quantity"], row["price"], row["subtotal"]), (self.product.id, 5, "16.80", "84.00")
+        )
+
+    def test_sellers(self):
+        for offer, quantity, subtotal in [(self.cheap, 3, "50.40"), (self.pricier, 2, "33.60")]:
+            (row,) = csv.DictReader(io.StringIO(self.export(offer.seller, "?format=csv&role=seller")))
+            # just their part of the line, at the price it was sold at
+            self.assertEqual(
+                (row["product_id"], row["seller_id"], row["quantity"], row["price"], row["subtotal"]),
+                (str(self.product.id), str(offer.seller_id), str(quantity), "16.80", subtotal),
+            )
+        # the buyer didn't supply anything
+        self.assertEqual(self.export(self.buyer, "?role=seller"), "")
+
+    def test_removed_offer(self):
+        self.cheap.delete()
+        (row,) = [json.loads(line) for line in self.export(self.cheap.seller, "?role=seller").splitlines()]
+        self.assertEqual((row["seller_id"], row["quantity"]), (self.cheap.seller_id, 3))
@@ -1,20 +1,72 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
 from rest_framework import response
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 
-from order.models import Order
-from order.serializers import AddToCartSerializer, OrderSerializer
-from supply.generics.viewsets import QualifiedViewSet
+from order.export import COLUMNS, get_export_rows
+from order.models import Order, OrderLine
+from order.serializers import AddToCartSerializer, OrderExportSerializer, OrderLinesSerializer, OrderSerializer
+from supply.generics.conditional import conditional_view
+from supply.generics.renderers import CSVRenderer, NDJSONRenderer
+from supply.generics.serializers import ValuesMapper
+from supply.generics.viewsets import AsyncViewSetMixin, QualifiedViewSet, ValuesListMixin
+
+
+async def orders_state(request, *args, **kwargs):
+    # confirmed orders have their prices frozen, so the orders themselves are all that can change
+    state = await Order.objects.filter(buyer=request.user, is_confirmed=True).aaggregate(
+        last_modified=Max("date_updated"), count=Count("id")
+    )
+    return state["last_modified"], state["count"], request.user.pk
+
 
+async def cart_state(request, *args, **kwargs):
+    # every change to the cart recalculates and saves its totals, but an open cart also
+    # shows the current product prices so those have to be taken into account too
+    cart = await Order.objects.filter(buyer=request.user, is_confirmed=False).annotate(
+        products_updated=Max("lines__product__date_updated"),
+        line_count=Count("lines"),
+    ).values_list("date_updated", "products_updated", "line_count", "pk").afirst()
+    if not cart:
+        return None
+    date_updated, products_updated, line_count, pk = cart
+    return max(date_updated, products_updated or date_updated), date_updated, products_updated, line_count, pk
 
-class OrderViewSet(QualifiedViewSet):
+
+class OrderViewSet(ValuesListMixin, AsyncViewSetMixin, QualifiedViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     queryset = Order.objects.all()
+    # newest orders first
+    pagination_ordering = "-id"
+    # the lines are fetched for the whole page in serialize_values
+    values_mapper = ValuesMapper(OrderSerializer, sources={"lines": None})
+    # the list only has confirmed orders, where the price of a line is the one it was sold at
+    lines_mapper = ValuesMapper(OrderLinesSerializer, sources={"price": "price"})
+
+    # the reads are async, the writes below stay sync as they need transactions
+    @conditional_view(orders_state)
+    async def list(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
 
     def get_queryset(self):
-        return self.queryset.filter(buyer=self.request.user).exclude(is_confirmed=False)
+        return self.queryset.filter(buyer=self.request.user).exclude(is_confirmed=False).with_lines()
+
+    def serialize_values(self, rows):
+        rows = list(rows)
+        lines = defaultdict(list)
+        for line in OrderLine.objects.filter(order_id__in=[row["id"] for row in rows]).order_by("id").values(
+            "order_id", *self.lines_mapper.lookups
+        ):
+            lines[line["order_id"]].append(self.lines_mapper(line))
+        for row in rows:
+            row["lines"] = lines[row["id"]]
+        return super().serialize_values(rows)
 
     # note: the following two don't act on the detail route, just the list route.
     # this is based on the assumption that a user can only have one open cart at
@@ -22,14 +74,22 @@ class OrderViewSet(QualifiedViewSet):
     # the detail route instead.
     @action(methods=['POST'], detail=False, serializer_class=AddToCartSerializer)
     def update_cart(self, request):
-        serializer = AddToCartSerializer(data=request.data)
+        """
+        Takes either a single `{"id": ..., "quantity": ...}` item, or a list of them to
+        update several products in the cart at once
+        """
+        serializer = AddToCartSerializer(data=request.data, many=isinstance(request.data, list))
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
 
-        open_cart, _ = Order.objects.get_or_create_open_order_for_user(self.request.user)
-        obj = serializer.add(open_cart, validated_data)
+        with transaction.atomic():
+            open_cart, _ = Order.objects.get_or_create_open_order_for_user(self.request.user)
+            # concurrent updates of the same cart wait for each other here, rather than
+            # both trying to add the same line and one of them failing
+            open_cart.lock()
+            obj = serializer.add(open_cart, validated_data)
 
-        return response.Response(status=200, data=OrderSerializer(instance=obj).data)
+        return response.Response(status=200, data=OrderSerializer(instance=obj.with_lines()).data)
 
     @action(methods=['POST'], detail=False, serializer_class=OrderSerializer)
     def checkout(self, request):
@@ -43,13 +103,32 @@ class OrderViewSet(QualifiedViewSet):
         if not cart or not cart.subtotal > 0:
             raise ValidationError("Please make sure you have items in your cart.")
         cart.checkout()
-        return self.list(request)
+        # the sync version of list, as this runs in a thread
+        return super().list(request)
 
     @action(methods=['GET'], detail=False, serializer_class=OrderSerializer)
-    def cart(self, request):
+    @conditional_view(cart_state)
+    async def cart(self, request):
         """
         Returns the active cart, or creates one and returns it
         """
-        cart, _ = Order.objects.get_or_create_open_order_for_user(request.user)
+        cart, _ = await Order.objects.aget_or_create_open_order_for_user_with_lines(request.user)
         serializer = OrderSerializer(instance=cart)
         return response.Response(status=200, data=serializer.data)
+
+    @action(methods=['GET'], detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer], pagination_class=None)
+    def export(self, request):
+        """
+        Streams the complete order history, a line per row, as NDJSON or as CSV with
+        `?format=csv` (or `Accept: text/csv`). Takes `role=seller` to export the lines
+        supplied rather than bought, and `date_from`/`date_to` to limit it to the
+        orders created in that range.
+        """
+        params = OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        renderer = request.accepted_renderer
+        rows = get_export_rows(request.user, **params.validated_data)
+        export = StreamingHttpResponse(renderer.stream(rows, COLUMNS), content_type=renderer.media_type)
+        export["Content-Disposition"] = f'attachment; filename="orders.{renderer.format}"'
+        return export
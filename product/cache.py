@@ -0,0 +1,116 @@
+"""
+A read-through cache for the product catalog endpoints.
+
+Every cached response is keyed on the current catalog version, so rather than
+hunting down and deleting keys when the catalog changes we bump the version and
+let the stale entries expire on their own.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "catalog:version"
+HITS_KEY = "catalog:hits"
+MISSES_KEY = "catalog:misses"
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock rather than 1 so that a version key which was
+        # evicted can't come back and pick up entries cached under an old version
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+
+
+def bump_version():
+    """
+    Invalidates everything that's cached for the catalog. This waits for the
+    current transaction to commit, otherwise a concurrent request could cache
+    the old data again before the write is visible.
+    """
+    transaction.on_commit(_bump_version)
+
+
+def _increment(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    return {
+        "version": get_version(),
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+    }
+
+
+def make_key(request, version):
+    # the host is part of the key as the pagination links are absolute urls
+    url = request.build_absolute_uri()
+    return f"catalog:{version}:{hashlib.md5(url.encode()).hexdigest()}"
+
+
+def get_or_set(request, get_data):
+    """
+    Returns the cached response data for this request, or calls `get_data`
+    to build it and caches the result
+    """
+    key = make_key(request, get_version())
+    data = cache.get(key)
+    if data is not None:
+        _increment(HITS_KEY)
+        return data
+
+    _increment(MISSES_KEY)
+    data = get_data()
+    cache.set(key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+
+# the same for async views
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+async def _aincrement(key):
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        pass
+
+
+async def aget_or_set(request, get_data):
+    """
+    get_or_set, where `get_data` is a coroutine function
+    """
+    key = make_key(request, await aget_version())
+    data = await cache.aget(key)
+    if data is not None:
+        await _aincrement(HITS_KEY)
+        return data
+
+    await _aincrement(MISSES_KEY)
+    data = await get_data()
+    await cache.aset(key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    return data
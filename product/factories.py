@@ -1,4 +1,5 @@
 import random, factory, json
+from functools import lru_cache
 
 from product.models import Offer, Product
 from factory import Faker
@@ -20,10 +21,15 @@ def coin_toss():
     return random.choice([0, 1])
 
 
+@lru_cache(maxsize=None)
+def get_product_data():
+    with open('generic_product_data.json') as json_data:
+        return json.load(json_data)
+
+
 def get_random_item():
-    json_data = open('generic_product_data.json')
-    data = json.load(json_data)
-    product_type = random.choice(list(data.keys()))
+    data = get_product_data()
+    product_type = random.choice(list(data))
     item_name = " ".join([random.choice(data[product_type]), product_type[:-1]]).title()
 
     if coin_toss():
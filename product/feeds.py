@@ -0,0 +1,191 @@
+"""
+Imports seller offer feeds: CSV or NDJSON rows of gtin, seller, quantity and
+seller_price.
+
+The feed is read as a stream of lines and handled in fixed-size batches. Each
+batch is upserted with a single INSERT .. ON CONFLICT on (seller, product), less
+any stock that's held in carts, and the price/stock of the products it touched
+is refreshed afterwards. Nothing but the current batch is kept in memory,
+however long the feed is.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from order.models import Allocation
+from product.models import Offer, Product
+from product.tasks import refresh_aggregates_later
+
+FIELDS = ["gtin", "seller", "quantity", "seller_price"]
+# how many of the invalid rows are reported back, the rest are only counted
+MAX_ERRORS = 100
+
+
+class FeedError(Exception):
+    pass
+
+
+def parse_csv(lines):
+    """
+    Yields the line number and a dict for each row of a CSV feed, which has to
+    start with a header
+    """
+    reader = csv.DictReader(lines)
+    missing = set(FIELDS) - set(reader.fieldnames or []) - {"seller"}
+    if missing:
+        raise FeedError(f"The feed is missing the {', '.join(sorted(missing))} column(s)")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_ndjson(lines):
+    """
+    Yields the line number and a dict for each line of a newline delimited JSON
+    feed. Lines that aren't valid JSON come through as None.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "ndjson": parse_ndjson,
+}
+
+
+def clean_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    missing = [field for field in ["gtin", "quantity", "seller_price"] if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    try:
+        quantity = int(row["quantity"])
+        seller_price = Decimal(str(row["seller_price"]))
+    except (ValueError, InvalidOperation):
+        raise ValueError("quantity and seller_price should be numbers")
+    if quantity < 0:
+        raise ValueError("quantity can't be negative")
+    # seller_price has 12 digits, 2 of them decimals
+    if not seller_price.is_finite() or not 0 < seller_price < 10 ** 10 or seller_price.as_tuple().exponent < -2:
+        raise ValueError("seller_price should be a positive amount with at most 2 decimals")
+    return str(row["gtin"]).strip(), quantity, seller_price
+
+
+def subtract_held_stock(offers):
+    """
+    Takes the stock that's held in carts off the quantities of the given offers,
+    keyed on (seller_id, product_id). A feed has the seller's total stock, but
+    with CART_RESERVATIONS the held stock has already been taken off the offer
+    and is added back when it's released, so it would otherwise be counted twice.
+    An offer with less stock in the feed than is held is set to 0.
+
+    The existing offers are locked until the end of the transaction, so that no
+    more stock can be held from them in between reading the holds and the upsert.
+    """
+    existing = Offer.objects.filter(
+        seller_id__in={seller_id for seller_id, _ in offers},
+        product_id__in={product_id for _, product_id in offers},
+    )
+    list(existing.select_for_update().values_list("id", flat=True))
+    held = Allocation.objects.filter(offer__in=existing, expires_at__isnull=False).order_by().values(
+        "offer__seller_id", "offer__product_id"
+    ).annotate(total=Sum("quantity")).values_list("offer__seller_id", "offer__product_id", "total")
+    for seller_id, product_id, total in held:
+        offer = offers.get((seller_id, product_id))
+        if offer:
+            offer.quantity = max(offer.quantity - total, 0)
+
+
+def import_offers(rows, seller=None, batch_size=1000):
+    """
+    Upserts the offers in `rows` (line numbers and dicts, as yielded by one of
+    the parsers) and returns how many rows there were, how many offers were
+    written and the invalid rows.
+
+    With a `seller` every row is taken to be theirs (a `seller` column, if there
+    is one, has to match their username), otherwise the `seller` column holds
+    the username of the seller.
+    """
+    stats = {"rows": 0, "offers": 0, "invalid": 0, "errors": []}
+
+    def reject(line, message):
+        stats["invalid"] += 1
+        if len(stats["errors"]) < MAX_ERRORS:
+            stats["errors"].append({"line": line, "error": message})
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        stats["rows"] += len(batch)
+
+        cleaned = []
+        for line, row in batch:
+            try:
+                gtin, quantity, seller_price = clean_row(row)
+            except ValueError as error:
+                reject(line, f"Invalid row, {error}")
+                continue
+            username = str(row.get("seller") or "").strip() or None
+            if seller and username not in (None, seller.get_username()):
+                reject(line, f"Offers can only be imported for {seller.get_username()}")
+                continue
+            if not seller and not username:
+                reject(line, "No seller given")
+                continue
+            cleaned.append((line, gtin, username, quantity, seller_price))
+
+        products = dict(
+            Product.objects.filter(gtin__in={row[1] for row in cleaned}).values_list("gtin", "id")
+        )
+        if seller:
+            sellers = {}
+        else:
+            sellers = dict(
+                get_user_model().objects.filter(
+                    username__in={row[2] for row in cleaned}
+                ).values_list("username", "id")
+            )
+
+        # the same offer can only be upserted once per statement, the last row for it wins
+        offers = {}
+        for line, gtin, username, quantity, seller_price in cleaned:
+            if gtin not in products:
+                reject(line, f"No product with GTIN {gtin}")
+                continue
+            seller_id = seller.pk if seller else sellers.get(username)
+            if not seller_id:
+                reject(line, f"No seller {username}")
+                continue
+            offers[(seller_id, products[gtin])] = Offer(
+                seller_id=seller_id, product_id=products[gtin], quantity=quantity, seller_price=seller_price
+            )
+
+        if offers:
+            with transaction.atomic():
+                subtract_held_stock(offers)
+                Offer.objects.bulk_create(
+                    offers.values(),
+                    update_conflicts=True,
+                    # the column names, Django 4.1.0 doesn't translate the field names
+                    unique_fields=["seller_id", "product_id"],
+                    update_fields=["quantity", "seller_price", "date_updated"],
+                )
+                # bulk_create doesn't send the signals that would do this
+                refresh_aggregates_later({product_id for _, product_id in offers})
+            stats["offers"] += len(offers)
+
+    stats["errors"].sort(key=lambda error: error["line"])
+    return stats
@@ -0,0 +1,46 @@
+from rest_framework.filters import BaseFilterBackend
+
+from product.serializers import ProductFilterSerializer
+
+RANGES = ["price", "weight", "length", "height", "width"]
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Filters the products on the query parameters of ProductFilterSerializer,
+    i.e `?search=chair&in_stock=true&max_price=50`. All of them end up as
+    conditions on the one query that is paginated as usual.
+
+    The name search is a case insensitive substring match. Django compares
+    UPPER(name) for that, which Postgres answers from the trigram index on the
+    same expression.
+    """
+    def filter_queryset(self, request, queryset, view):
+        params = ProductFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        if filters.get("search"):
+            queryset = queryset.filter(name__icontains=filters["search"])
+        if filters.get("gtin"):
+            queryset = queryset.filter(gtin=filters["gtin"])
+        if filters.get("in_stock"):
+            queryset = queryset.filter(available_quantity__gt=0)
+        for field in RANGES:
+            if filters.get(f"min_{field}") is not None:
+                queryset = queryset.filter(**{f"{field}__gte": filters[f"min_{field}"]})
+            if filters.get(f"max_{field}") is not None:
+                queryset = queryset.filter(**{f"{field}__lte": filters[f"max_{field}"]})
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": str(field.help_text or ""),
+                "schema": {"type": "string"},
+            }
+            for name, field in ProductFilterSerializer().fields.items()
+        ]
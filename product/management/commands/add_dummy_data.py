@@ -1,8 +1,13 @@
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from product import cache, seeding
 from product.factories import OfferFactory
+from product.models import Product
 from user.factories import UserFactory
 
 
@@ -12,6 +17,12 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('username', nargs='?', default=None)
         parser.add_argument('range', nargs='?', default=None, type=int)
+        parser.add_argument('--bulk', action='store_true',
+                            help='Generate everything in memory and write it with bulk inserts, for large data sets')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Products per insert in bulk mode')
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing batches in bulk mode')
+        parser.add_argument('--sellers', type=int, default=100, help='Size of the seller pool in bulk mode')
+        parser.add_argument('--max-offers', type=int, default=3, help='Maximum offers per product in bulk mode')
 
     def create_user(self, **params):
         try:
@@ -48,7 +59,48 @@ class Command(BaseCommand):
 
         amount = options['range'] or random.randint(50,500)
 
+        if options['bulk']:
+            self.bulk_create_products(amount, **options)
+            return
+
         for i in range(amount):
             OfferFactory()
 
         print(f"--- Added {amount} products")
+
+    def bulk_create_products(self, amount, batch_size, workers, sellers, max_offers, **options):
+        """
+        The factories query for every name and GTIN they come up with and make a new
+        seller for every offer, which is fine for a few hundred products but not for
+        a million. This makes the names up front (unique across all workers), hands
+        out GTINs from a counter and shares a pool of sellers instead.
+        """
+        if batch_size < 1 or workers < 1 or sellers < 1 or max_offers < 1:
+            raise CommandError('--batch-size, --workers, --sellers and --max-offers must be at least 1')
+
+        started = time.monotonic()
+        seller_ids = [seller.id for seller in seeding.create_sellers(sellers)]
+        taken = set(Product.objects.values_list('name', flat=True).iterator())
+        names = list(seeding.generate_names(amount, taken))
+        first_gtin_number = seeding.get_next_gtin_number()
+        print(f"--- Generated {amount} product names and {sellers} sellers in {time.monotonic() - started:.1f}s")
+
+        chunk_size = -(-amount // workers)
+        jobs = [
+            (names[start:start + chunk_size], first_gtin_number + start, seller_ids, max_offers, batch_size)
+            for start in range(0, amount, chunk_size)
+        ]
+        if workers == 1:
+            rows = sum(seeding.seed_products(*job) for job in jobs)
+        else:
+            # the workers are forked from this process, so they mustn't inherit its connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rows = sum(executor.map(seeding.seed_products_in_worker, *zip(*jobs)))
+
+        # the bulk inserts skip the signals that would otherwise do this
+        cache.bump_version()
+
+        elapsed = time.monotonic() - started
+        print(f"--- Added {amount} products and {rows - amount} offers in {elapsed:.1f}s "
+              f"({(rows + sellers) / elapsed:.0f} rows/s)")
@@ -0,0 +1,73 @@
+import csv
+import io
+import random
+import resource
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from product.feeds import import_offers, parse_csv
+from product.models import Product
+
+
+def generate_feed(gtins, sellers, rows):
+    """
+    Yields the lines of a CSV feed with `rows` offers, without ever holding it
+    in memory
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        writer.writerow(row)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(["gtin", "seller", "quantity", "seller_price"])
+    written = 0
+    while written < rows:
+        for seller in sellers:
+            for gtin in gtins.iterator():
+                yield line([gtin, seller, random.randint(0, 20), random.randint(100, 9999) / 100])
+                written += 1
+                if written >= rows:
+                    return
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams a generated CSV feed of offers through the importer and reports the rows per second and '
+        'peak memory. It upserts the offers of a fixed set of benchmark sellers, so running it again '
+        'measures updating them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default=100000, type=int)
+        parser.add_argument('--sellers', default=10, type=int, help='How many sellers the offers are spread over')
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        gtins = Product.objects.exclude(gtin=None).order_by('id').values_list('gtin', flat=True)
+        if not gtins.exists():
+            raise CommandError('There are no products with a GTIN, run add_dummy_data first')
+
+        User = get_user_model()
+        sellers = [f"feed-bench-seller-{i}" for i in range(options['sellers'])]
+        User.objects.bulk_create([User(username=username) for username in sellers], ignore_conflicts=True)
+
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.monotonic()
+        stats = import_offers(
+            parse_csv(generate_feed(gtins, sellers, options['rows'])), batch_size=options['batch_size']
+        )
+        elapsed = time.monotonic() - started
+        memory_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        print(f"--- Imported {stats['offers']} offers from {stats['rows']} rows ({stats['invalid']} invalid) "
+              f"in {elapsed:.1f}s")
+        print(f"--- {stats['rows'] / elapsed:.0f} rows/s with batches of {options['batch_size']}")
+        # ru_maxrss is in kilobytes on linux
+        print(f"--- Peak memory grew by {(memory_after - memory_before) / 1024:.1f}MB")
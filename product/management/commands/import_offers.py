@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from product.feeds import PARSERS, FeedError, import_offers
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports a CSV or NDJSON feed of offers (gtin, seller, quantity and seller_price per row), '
+        'creating or updating the offers in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The feed to import, or - to read it from stdin')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='Guessed from the file extension by default')
+        parser.add_argument('--seller', help='The username of the seller the whole feed is for, if it has no seller column')
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        feed_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if feed_format not in PARSERS:
+            raise CommandError('Pass --format, the format can\'t be told from the file name')
+
+        seller = None
+        if options['seller']:
+            try:
+                seller = get_user_model().objects.get(username=options['seller'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"There's no seller {options['seller']}")
+
+        feed = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        started = time.monotonic()
+        try:
+            with feed:
+                stats = import_offers(PARSERS[feed_format](feed), seller=seller, batch_size=options['batch_size'])
+        except FeedError as error:
+            raise CommandError(str(error))
+        elapsed = time.monotonic() - started
+
+        for error in stats['errors']:
+            print(f"--- Line {error['line']}: {error['error']}")
+        print(f"--- Imported {stats['offers']} offers from {stats['rows']} rows, {stats['invalid']} invalid, "
+              f"in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 0.001):.0f} rows/s)")
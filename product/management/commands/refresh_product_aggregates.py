@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized price and stock columns for the whole catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=10000, type=int)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Product.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        total = 0
+
+        # walk the catalog in id ranges so each UPDATE stays a short transaction
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                total += Product.objects.filter(
+                    id__gte=batch[0], id__lte=batch[-1]
+                ).refresh_aggregates()
+            last_id = batch[-1]
+
+        print(f"--- Refreshed {total} products")
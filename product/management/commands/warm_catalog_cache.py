@@ -0,0 +1,46 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from product.viewsets import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Fills the catalog cache by walking the product list, i.e after a deploy'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host', default='localhost:8000',
+            help='The host clients reach the API on, as the pagination links are absolute'
+        )
+        parser.add_argument('--pages', default=20, type=int, help='How many list pages to warm')
+        parser.add_argument('--details', action='store_true', help='Also warm the product detail pages')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory(SERVER_NAME=options['host'].split(':')[0])
+        extra = {'HTTP_HOST': options['host']}
+        # the catalog is the same for every user, so an unsaved user is enough to get past the permissions
+        user = get_user_model()()
+        list_view = async_to_sync(ProductViewSet.as_view({'get': 'list'}))
+        detail_view = ProductViewSet.as_view({'get': 'retrieve'})
+
+        url = '/api/products/'
+        pages = 0
+        products = 0
+        while url and pages < options['pages']:
+            request = factory.get(url, **extra)
+            force_authenticate(request, user=user)
+            data = list_view(request).data
+            pages += 1
+
+            if options['details']:
+                for item in data['results']:
+                    request = factory.get(f"/api/products/{item['id']}/", **extra)
+                    force_authenticate(request, user=user)
+                    detail_view(request, pk=item['id'])
+                    products += 1
+
+            url = data['next']
+
+        print(f"--- Warmed {pages} list pages and {products} products")
@@ -0,0 +1,49 @@
+# Generated by Django 4.1 on 2026-10-18 17:57
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+
+def populate_aggregates(apps, schema_editor):
+    Offer = apps.get_model('product', 'Offer')
+    Product = apps.get_model('product', 'Product')
+
+    offers = Offer.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        price=Subquery(
+            offers.annotate(
+                value=Round(Avg('seller_price') * Decimal('1.12'), 2, output_field=DecimalField())
+            ).values('value')
+        ),
+        available_quantity=Coalesce(Subquery(offers.annotate(value=Sum('quantity')).values('value')), 0),
+        offer_count=Coalesce(Subquery(offers.annotate(value=Count('id')).values('value')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_quantity',
+            field=models.PositiveIntegerField(default=0, help_text='Available, sellable inventory across all offers'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='offer_count',
+            field=models.PositiveIntegerField(default=0, help_text='The number of offers for this product'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, default=None, help_text='The price we sell this product at: the average offer price with some margin added', max_digits=14, null=True),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_product_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['product', 'seller_price', '-quantity'], name='offer_allocation_idx'),
+        ),
+    ]
@@ -1,8 +1,38 @@
+from decimal import Decimal
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
-from django.utils.functional import cached_property
+from django.db.models.functions import Coalesce, Now, Round, Upper
 
+from product import cache
 from supply.generics.mixins import ModelWithDatetime
-from django.db.models import Avg, F, Sum
+from django.db.models import Avg, Count, DecimalField, F, OuterRef, Subquery, Sum
+
+PRICE_MARGIN = Decimal("1.12")
+
+
+class ProductQuerySet(models.QuerySet):
+    def refresh_aggregates(self):
+        """
+        Recomputes the denormalized price/stock columns for every product in
+        this queryset with a single UPDATE, rather than per product
+        """
+        offers = Offer.objects.filter(product=OuterRef("pk")).order_by().values("product")
+        cache.bump_version()
+        return self.update(
+            price=Subquery(
+                offers.annotate(
+                    value=Round(Avg("seller_price") * PRICE_MARGIN, 2, output_field=DecimalField())
+                ).values("value")
+            ),
+            available_quantity=Coalesce(
+                Subquery(offers.annotate(value=Sum("quantity")).values("value")), 0
+            ),
+            offer_count=Coalesce(
+                Subquery(offers.annotate(value=Count("id")).values("value")), 0
+            ),
+            date_updated=Now(),
+        )
 
 
 class Product(ModelWithDatetime):
@@ -39,40 +69,65 @@ class Product(ModelWithDatetime):
         help_text="The image of this product, if any"
     )
 
-    @cached_property
-    def in_stock(self):
-        return self.offers.exists()
+    # the below are denormalized from the offers and are kept up to date by
+    # ProductQuerySet.refresh_aggregates whenever the offers change
+    price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=None,
+        null=True,
+        blank=True,
+        help_text="The price we sell this product at: the average offer price with some margin added"
+    )
+    available_quantity = models.PositiveIntegerField(
+        default=0,
+        help_text="Available, sellable inventory across all offers"
+    )
+    offer_count = models.PositiveIntegerField(
+        default=0,
+        help_text="The number of offers for this product"
+    )
 
-    @cached_property
-    def price(self):
-        """
-        This would probably be a database field in practice, but it would be the
-        price that we choose to sell it at: i.e, taking out some offers that are
-        some std deviation from the median then taking an average across the
-        remaining with some margin added.
-        """
-        seller_price = self.offers.annotate(
-            average_price=Avg('seller_price')
-        ).values("average_price")[0]["average_price"]
+    objects = ProductQuerySet.as_manager()
 
-        return round(float(seller_price) * 1.12, 2)  # some margin
+    class Meta:
+        indexes = [
+            # for the name search on the product list, see product.filters. icontains
+            # compares UPPER(name), so that's what has to be indexed
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="product_name_upper_trgm_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
 
-    @cached_property
+    @property
+    def in_stock(self):
+        return self.available_quantity > 0
+
+    @property
     def quantity(self):
-        """
-        This should probably be a database field that is updated at the time
-        that stock lists from sellers are refreshed, it's not worth the
-        additional db hit
-        """
-        return self.offers.aggregate(Sum('quantity')).get("quantity__sum")
+        return self.available_quantity
 
-    def reduce_quantity(self, reserved):
+    def refresh_aggregates(self):
+        Product.objects.filter(pk=self.pk).refresh_aggregates()
+        self.refresh_from_db(fields=["price", "available_quantity", "offer_count"])
+
+    def reduce_quantity(self, allocations):
         """
-        This is fairly basic for this exercise, as there is a single offer available.
-        In practice, reducing quantity availability would depend on several factors
-        and it's significantly out of scope for this exercise.
+        Takes stock off the offers it has been allocated from, given as
+        `(offer_id, quantity)` pairs (see order.allocation). Each offer is only
+        reduced if it still has enough stock, so this never oversells; the ids
+        of the offers that didn't are returned.
+
+        The offers are updated in id order so that concurrent callers always
+        lock them in the same order. The price/stock of the product is left to
+        the caller to refresh, once for everything it has taken.
         """
-        return self.offers.update(quantity=F("quantity")-reserved)
+        short_offer_ids = []
+        for offer_id, quantity in sorted(allocations):
+            if not self.offers.filter(id=offer_id, quantity__gte=quantity).update(
+                quantity=F("quantity") - quantity
+            ):
+                short_offer_ids.append(offer_id)
+        return short_offer_ids
 
 
 class Offer(ModelWithDatetime):
@@ -103,3 +158,7 @@ class Offer(ModelWithDatetime):
 
     class Meta:
         unique_together = ('seller', 'product',)  # prevent duplicate/staggered offers from same sellers
+        indexes = [
+            # the order offers are allocated from, see order.allocation
+            models.Index(fields=['product', 'seller_price', '-quantity'], name='offer_allocation_idx'),
+        ]
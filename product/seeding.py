@@ -0,0 +1,122 @@
+"""
+Bulk generation of dummy products, offers and sellers for load testing.
+
+Unlike the factories, nothing here queries the database to check for
+duplicates: names are deduplicated in memory by the caller and GTINs are
+handed out from a counter, so every row can be written with bulk_create.
+"""
+import random
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Max
+
+from product.factories import get_random_item
+from product.models import PRICE_MARGIN, Offer, Product
+
+# the 200-299 GTIN prefixes are reserved for in-store use, so they can't clash
+# with real products
+GTIN_PREFIX = "200"
+
+
+def get_check_digit(body):
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(body))
+    return str((10 - total % 10) % 10)
+
+
+def make_gtin(number):
+    body = f"{GTIN_PREFIX}{number:09d}"
+    return body + get_check_digit(body)
+
+
+def get_next_gtin_number():
+    last = Product.objects.filter(gtin__startswith=GTIN_PREFIX).aggregate(last=Max("gtin"))["last"]
+    return int(last[len(GTIN_PREFIX):-1]) + 1 if last else 0
+
+
+def generate_names(amount, taken):
+    """
+    Yields `amount` product names that aren't in `taken` (and adds them to it).
+    Once the random names start running out they get numbered instead.
+    """
+    for _ in range(amount):
+        name = get_random_item()
+        if name in taken:
+            base = name
+            number = 2
+            while name in taken:
+                name = f"{base} {number}"
+                number += random.randint(1, 100)
+        taken.add(name)
+        yield name
+
+
+def create_sellers(amount):
+    User = get_user_model()
+    return list(
+        User.objects.bulk_create(
+            User(username=uuid.uuid4().hex, password="!", first_name="Seller") for _ in range(amount)
+        )
+    )
+
+
+def seed_products(names, first_gtin_number, seller_ids, max_offers, batch_size):
+    """
+    Writes a product for each of the given names along with 1 to `max_offers`
+    offers from the seller pool. The price and stock columns are filled in
+    from the generated offers directly, so there's nothing to refresh
+    afterwards. Returns how many rows were written.
+    """
+    rows = 0
+    for start in range(0, len(names), batch_size):
+        products = []
+        offers = []
+        for index, name in enumerate(names[start:start + batch_size], start=start):
+            product_offers = [
+                Offer(
+                    seller_id=seller_id,
+                    quantity=random.randint(0, 20),
+                    seller_price=Decimal(random.randint(1, 99)),
+                )
+                for seller_id in random.sample(seller_ids, random.randint(1, min(max_offers, len(seller_ids))))
+            ]
+            average_price = sum(offer.seller_price for offer in product_offers) / len(product_offers)
+            products.append(
+                Product(
+                    name=name,
+                    gtin=make_gtin(first_gtin_number + index),
+                    height=random.randint(300, 999),
+                    width=random.randint(300, 999),
+                    length=random.randint(300, 999),
+                    weight=random.randint(1, 9),
+                    price=(average_price * PRICE_MARGIN).quantize(Decimal("0.01")),
+                    available_quantity=sum(offer.quantity for offer in product_offers),
+                    offer_count=len(product_offers),
+                )
+            )
+            offers.append(product_offers)
+
+        # bulk_create gets the ids of the new products back from the same INSERT (with
+        # RETURNING), which the offers need. COPY would be faster still, but it would
+        # need the ids handed out separately and every row formatted by hand
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            for product, product_offers in zip(products, offers):
+                for offer in product_offers:
+                    offer.product_id = product.id
+            flattened = [offer for product_offers in offers for offer in product_offers]
+            Offer.objects.bulk_create(flattened)
+        rows += len(products) + len(flattened)
+    return rows
+
+
+def seed_products_in_worker(*args):
+    """
+    The entry point for a worker process, which needs its own connections
+    """
+    try:
+        return seed_products(*args)
+    finally:
+        connections.close_all()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -37,6 +38,82 @@ class ProductSerializer(serializers.Serializer):
         read_only=True,
     )
     quantity = serializers.IntegerField(
+        source="available_quantity",
         help_text="Available, sellable inventory amount",
         read_only=True,
     )
+    in_stock = serializers.BooleanField(
+        help_text="Whether there is any sellable inventory for this product",
+        read_only=True,
+    )
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    The query parameters the product list can be filtered on, see
+    product.filters
+    """
+    search = serializers.CharField(
+        required=False,
+        help_text="Only products with this in their name",
+    )
+    gtin = serializers.CharField(
+        required=False,
+        max_length=13,
+        help_text="The product with this exact GTIN",
+    )
+    min_price = serializers.DecimalField(
+        required=False,
+        max_digits=14,
+        decimal_places=2,
+        help_text="Only products at or above this price",
+    )
+    max_price = serializers.DecimalField(
+        required=False,
+        max_digits=14,
+        decimal_places=2,
+        help_text="Only products at or below this price",
+    )
+    in_stock = serializers.BooleanField(
+        required=False,
+        help_text="Only products with sellable inventory",
+    )
+    min_weight = serializers.IntegerField(required=False, min_value=0, help_text="In kg")
+    max_weight = serializers.IntegerField(required=False, min_value=0, help_text="In kg")
+    min_length = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+    max_length = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+    min_height = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+    max_height = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+    min_width = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+    max_width = serializers.IntegerField(required=False, min_value=0, help_text="In mm")
+
+
+class ResolveSerializer(serializers.Serializer):
+    gtins = serializers.ListField(
+        child=serializers.CharField(max_length=13),
+        allow_empty=False,
+        max_length=settings.GTIN_RESOLVE_LIMIT,
+        help_text="The GTINs to look up",
+    )
+
+
+class ResolvedProductSerializer(serializers.Serializer):
+    gtin = serializers.CharField(
+        read_only=True,
+    )
+    id = serializers.IntegerField(
+        read_only=True,
+    )
+    price = serializers.CharField(
+        help_text="The price of the product",
+        read_only=True,
+    )
+    quantity = serializers.IntegerField(
+        source="available_quantity",
+        help_text="Available, sellable inventory amount",
+        read_only=True,
+    )
+    in_stock = serializers.BooleanField(
+        help_text="Whether there is any sellable inventory for this product",
+        read_only=True,
+    )
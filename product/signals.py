@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from product import cache
+from product.models import Offer, Product
+from product.tasks import refresh_aggregates_later
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def refresh_product_aggregates(sender, instance, **kwargs):
+    """
+    Keep the denormalized price/stock columns on the product in step with its
+    offers. Queryset-level updates don't send signals, so anything that updates
+    offers in bulk has to call refresh_aggregates itself.
+    """
+    refresh_aggregates_later([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_catalog_version(sender, instance, **kwargs):
+    cache.bump_version()
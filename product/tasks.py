@@ -0,0 +1,29 @@
+from django.conf import settings
+
+from job.queue import enqueue, task
+from product.models import Product
+
+
+@task
+def refresh_aggregates(product_id):
+    Product.objects.filter(pk=product_id).refresh_aggregates()
+
+
+def refresh_aggregates_later(product_ids):
+    """
+    Refreshes the price/stock of the given products once their offers have
+    changed. With DEFERRED_AGGREGATES that's left to a background job per
+    product, of which only one is ever waiting to run, so a product whose
+    offers change many times in a row is still only refreshed once. The job
+    is queued once the change is committed, see job.queue.enqueue.
+    """
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    if not settings.DEFERRED_AGGREGATES:
+        Product.objects.filter(id__in=product_ids).refresh_aggregates()
+        return
+    enqueue(
+        refresh_aggregates.job(product_id=product_id, dedupe_key=f"product-aggregates:{product_id}")
+        for product_id in product_ids
+    )
@@ -0,0 +1,225 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from product.factories import OfferFactory, ProductFactory
+from product.models import Offer, Product
+from user.factories import UserFactory
+
+
+class ProductQueryCountTests(APITestCase):
+    """
+    The product endpoints should take the same number of queries whatever the
+    page size, rather than one or more per product or offer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        for _ in range(30):
+            offer = OfferFactory(quantity=10)
+            # a product with several offers is still listed once
+            OfferFactory(product=offer.product, quantity=5)
+        Product.objects.refresh_aggregates()
+        cls.product = Product.objects.first()
+
+    def setUp(self):
+        # every request should reach the database rather than the catalog cache
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def assert_list_queries(self):
+        for page_size in [5, 25]:
+            cache.clear()
+            with self.assertNumQueries(1):
+                response = self.client.get(f"/api/products/?page_size={page_size}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), page_size)
+            self.assertEqual(len({product["id"] for product in response.data["results"]}), page_size)
+
+    def test_list(self):
+        self.assert_list_queries()
+
+    @override_settings(FAST_SERIALIZATION=False)
+    def test_list_through_the_serializer(self):
+        self.assert_list_queries()
+
+    def test_retrieve(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], self.product.id)
+
+    def test_retrieve_unknown_product(self):
+        missing_id = Product.objects.order_by("-id").first().id + 1
+        for path in ["abc", missing_id]:
+            response = self.client.get(f"/api/products/{path}/")
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn("ETag", response)
+
+
+class ProductListTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.split = OfferFactory(quantity=10, seller_price=Decimal("10.00")).product
+        OfferFactory(product=cls.split, quantity=5, seller_price=Decimal("20.00"))
+        cls.sold_out = OfferFactory(quantity=0, seller_price=Decimal("5.00")).product
+        # never listed, as nobody sells it
+        cls.unsold = ProductFactory()
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get_products(self, path="/api/products/?page_size=1"):
+        products = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            products += response.data["results"]
+            path = response.data["next"]
+        return products
+
+    def test_list(self):
+        products = self.get_products()
+        # every product with offers once, however many offers it has, at the average
+        # offer price plus the margin
+        self.assertEqual([product["id"] for product in products], [self.split.id, self.sold_out.id])
+        split, sold_out = products
+        self.assertEqual(
+            (split["price"], split["quantity"], split["in_stock"]), ("16.80", 15, True)
+        )
+        self.assertEqual((sold_out["quantity"], sold_out["in_stock"]), (0, False))
+
+    def test_filters(self):
+        self.assertEqual(
+            [product["id"] for product in self.get_products("/api/products/?in_stock=true")], [self.split.id]
+        )
+        self.assertEqual(
+            [product["id"] for product in self.get_products(f"/api/products/?search={self.split.name[2:].lower()}")],
+            [self.split.id],
+        )
+
+    def test_follows_offer_changes(self):
+        offer = self.split.offers.order_by("id").first()
+        offer.quantity = 2
+        offer.save()
+        split = self.get_products()[0]
+        self.assertEqual((split["quantity"], split["in_stock"]), (7, True))
+
+
+class ResolveTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.in_stock = OfferFactory(quantity=3).product
+        cls.sold_out = OfferFactory(quantity=0).product
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def resolve(self, gtins):
+        return self.client.post("/api/products/resolve/", {"gtins": gtins}, format="json")
+
+    def test_resolve(self):
+        response = self.resolve([self.sold_out.gtin, "0000000000000", self.in_stock.gtin, self.sold_out.gtin, "123"])
+        self.assertEqual(response.status_code, 200)
+        # in the order they were asked for, once each
+        self.assertEqual(
+            [(product["gtin"], product["id"], product["quantity"], product["in_stock"])
+             for product in response.data["results"]],
+            [(self.sold_out.gtin, self.sold_out.id, 0, False), (self.in_stock.gtin, self.in_stock.id, 3, True)],
+        )
+        self.assertEqual(response.data["missing"], ["0000000000000", "123"])
+
+    def test_nothing_found(self):
+        response = self.resolve(["0000000000000"])
+        self.assertEqual(response.data, {"results": [], "missing": ["0000000000000"]})
+
+    def test_invalid(self):
+        self.assertEqual(self.resolve([]).status_code, 400)
+        self.assertEqual(self.resolve(["12345678901234"]).status_code, 400)
+        self.assertEqual(self.resolve(["0000000000000"] * (settings.GTIN_RESOLVE_LIMIT + 1)).status_code, 400)
+
+
+@override_settings(DEFERRED_AGGREGATES=False)
+class FeedImportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserFactory()
+        cls.offer = OfferFactory(seller=cls.seller, quantity=5, seller_price=Decimal("10.00"))
+        cls.new_product = ProductFactory()
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.seller)
+
+    def import_feed(self, body, content_type="text/csv"):
+        return self.client.generic("POST", "/api/offers/import/", body.encode(), content_type=content_type)
+
+    def get_offers(self):
+        return {
+            product_id: (quantity, str(seller_price))
+            for product_id, quantity, seller_price in Offer.objects.filter(seller=self.seller).values_list(
+                "product_id", "quantity", "seller_price"
+            )
+        }
+
+    def test_csv(self):
+        other_seller = UserFactory()
+        response = self.import_feed(
+            "gtin,quantity,seller_price,seller\n"
+            f"{self.offer.product.gtin},8,12.50,\n"
+            f"{self.new_product.gtin},3,4.00,{self.seller.username}\n"
+            f"{self.new_product.gtin},-1,4.00,\n"
+            "0000000000000,3,4.00,\n"
+            f"{self.new_product.gtin},3,4.001,\n"
+            f"{self.new_product.gtin},3,4.00,{other_seller.username}\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["rows"], response.data["offers"], response.data["invalid"]), (6, 2, 4))
+        # the line numbers count the header
+        self.assertEqual([error["line"] for error in response.data["errors"]], [4, 5, 6, 7])
+        # the existing offer is updated and the new one created
+        self.assertEqual(
+            self.get_offers(), {self.offer.product_id: (8, "12.50"), self.new_product.id: (3, "4.00")}
+        )
+        self.assertEqual(Product.objects.get(pk=self.new_product.pk).available_quantity, 3)
+
+    def test_ndjson(self):
+        response = self.import_feed(
+            f'{{"gtin": "{self.new_product.gtin}", "quantity": 2, "seller_price": 1.5}}\n'
+            "not json\n"
+            "\n"
+            f'{{"gtin": "{self.offer.product.gtin}", "quantity": 1}}\n'
+            f'{{"gtin": "{self.new_product.gtin}", "quantity": 4, "seller_price": "2.50"}}\n',
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 4])
+        # the last row for an offer wins
+        self.assertEqual(
+            self.get_offers(), {self.offer.product_id: (5, "10.00"), self.new_product.id: (4, "2.50")}
+        )
+
+    @override_settings(CART_RESERVATIONS=True)
+    def test_held_stock(self):
+        buyer = APIClient()
+        buyer.force_authenticate(UserFactory())
+        response = buyer.post("/api/orders/update_cart/", {"id": self.offer.product_id, "quantity": 2}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        # the feed has the seller's whole stock, 2 of which are in a cart
+        self.import_feed(f"gtin,quantity,seller_price\n{self.offer.product.gtin},7,10.00\n")
+        self.assertEqual(self.get_offers(), {self.offer.product_id: (5, "10.00")})
+
+    def test_invalid_feed(self):
+        self.assertEqual(self.import_feed("gtin,quantity\n").status_code, 400)
+        self.assertEqual(self.import_feed("gtin,quantity,seller_price\n", content_type="text/plain").status_code, 415)
+        self.assertEqual(self.get_offers(), {self.offer.product_id: (5, "10.00")})
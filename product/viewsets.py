@@ -1,15 +1,130 @@
-from rest_framework.permissions import IsAuthenticated
+import codecs
 
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from rest_framework import response, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+from product import cache, feeds
+from product.filters import ProductFilterBackend
 from product.models import Product
-from product.serializers import ProductSerializer
-from supply.generics.viewsets import QualifiedViewSet
+from product.serializers import ProductSerializer, ResolvedProductSerializer, ResolveSerializer
+from supply.generics.conditional import conditional_view
+from supply.generics.serializers import ValuesMapper
+from supply.generics.viewsets import AsyncViewSetMixin, QualifiedViewSet, ValuesListMixin
+
+
+async def catalog_state(request, *args, **kwargs):
+    # the catalog version changes with every write to the catalog, see product.cache.
+    # It isn't a date, so the list only has an ETag and no Last-Modified
+    return None, await cache.aget_version()
+
 
+def product_state(request, pk, *args, **kwargs):
+    try:
+        return ProductViewSet.queryset.filter(pk=pk).values_list("date_updated", "id").first()
+    except (TypeError, ValueError):
+        # not a valid id, the view itself answers with a 404
+        return None
 
-class ProductViewSet(QualifiedViewSet):
+
+class ProductViewSet(ValuesListMixin, AsyncViewSetMixin, QualifiedViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     # limit the products to only ones with active offers. in
-    # practice, maybe remove products with 0 quantity as well
+    # practice, maybe remove products with 0 quantity as well.
+    # offer_count is denormalized onto the product so there's no join to
+    # the offers here, which would give a duplicate row per offer
     queryset = Product.objects.filter(
-        offers__isnull=False
+        offer_count__gt=0
     )
+    pagination_ordering = "id"
+    filter_backends = [ProductFilterBackend]
+    # in_stock is a property on the model, so the list has the database work it out
+    values_mapper = ValuesMapper(ProductSerializer, sources={"in_stock": "in_stock"})
+    values_annotations = {
+        "in_stock": ExpressionWrapper(Q(available_quantity__gt=0), output_field=BooleanField()),
+    }
+
+    # the catalog is the same for every user and only changes when the offers
+    # do, so list and retrieve are served from the cache where possible
+    # the list is the most requested endpoint, so it's async to keep it from
+    # tying up a thread per request when served over ASGI
+    @conditional_view(catalog_state)
+    async def list(self, request, *args, **kwargs):
+        async def get_data():
+            return (await self.alist(request, *args, **kwargs)).data
+
+        data = await cache.aget_or_set(request, get_data)
+        return response.Response(data)
+
+    @conditional_view(product_state)
+    def retrieve(self, request, *args, **kwargs):
+        data = cache.get_or_set(
+            request, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs).data
+        )
+        return response.Response(data)
+
+    @action(methods=['POST'], detail=False, serializer_class=ResolveSerializer, pagination_class=None)
+    def resolve(self, request):
+        """
+        Looks up a batch of products by GTIN in one go, i.e `{"gtins": ["8712345678906", ...]}`.
+        Returns the ID, price and stock of every product that was found, in the order
+        they were asked for, and lists the GTINs that weren't.
+        """
+        serializer = ResolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        gtins = list(dict.fromkeys(serializer.validated_data["gtins"]))
+
+        # price and stock are denormalized onto the product, so this is a single
+        # lookup on the unique gtin index
+        products = {
+            product.gtin: product
+            for product in Product.objects.filter(gtin__in=gtins).only("id", "gtin", "price", "available_quantity")
+        }
+        return response.Response({
+            "results": ResolvedProductSerializer(
+                [products[gtin] for gtin in gtins if gtin in products], many=True
+            ).data,
+            "missing": [gtin for gtin in gtins if gtin not in products],
+        })
+
+    @action(methods=['GET'], detail=False, permission_classes=[IsAdminUser], pagination_class=None)
+    def cache_stats(self, request):
+        """
+        Hit/miss counters for the catalog cache, for scraping into monitoring
+        """
+        return response.Response(cache.get_stats())
+
+
+class OfferViewSet(viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    # the formats of the feeds that can be posted to import
+    feed_formats = {
+        "text/csv": "csv",
+        "application/x-ndjson": "ndjson",
+        "application/ndjson": "ndjson",
+    }
+
+    @action(methods=['POST'], detail=False, url_path="import")
+    def import_feed(self, request):
+        """
+        Creates or updates the offers of the logged in seller from a feed posted as
+        the request body, either CSV (`Content-Type: text/csv`) with a header row or
+        NDJSON (`Content-Type: application/x-ndjson`), with the gtin, quantity and
+        seller_price of every offer. The body is read as it comes in, so the feed can
+        be as long as it needs to be.
+        """
+        content_type = request.content_type.split(";")[0].strip().lower()
+        if content_type not in self.feed_formats:
+            raise UnsupportedMediaType(content_type)
+        if request.stream is None:
+            raise ParseError("The feed is empty.")
+
+        lines = codecs.iterdecode(request.stream, "utf-8")
+        try:
+            stats = feeds.import_offers(feeds.PARSERS[self.feed_formats[content_type]](lines), seller=request.user)
+        except (feeds.FeedError, UnicodeDecodeError) as error:
+            raise ParseError(str(error))
+        return response.Response(stats)
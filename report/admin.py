@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+from report.models import DailyBuyerSales, DailyProductSales, DailySellerSales
+
+admin.site.register(DailyProductSales)
+admin.site.register(DailySellerSales)
+admin.site.register(DailyBuyerSales)
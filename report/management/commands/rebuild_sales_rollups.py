@@ -0,0 +1,35 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report import rollups
+from report.models import DailyBuyerSales, DailyProductSales, DailySellerSales
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the daily sales rollups from the order lines, i.e after deploying them or fixing orders by hand. '
+        'Checkouts keep them up to date otherwise'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild the days from this one (YYYY-MM-DD) onwards')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since should be a date, i.e 2022-08-01')
+
+        started = time.monotonic()
+        rollups.rebuild(since)
+        elapsed = time.monotonic() - started
+
+        counts = ', '.join(
+            f"{model.objects.count()} {model._meta.verbose_name_plural}"
+            for model in [DailyProductSales, DailySellerSales, DailyBuyerSales]
+        )
+        print(f"--- Rebuilt the rollups in {elapsed:.1f}s: {counts}")
@@ -0,0 +1,78 @@
+# Generated by Django 4.1 on 2026-10-18 18:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('product', '0004_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySellerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, help_text='The datetime this was created')),
+                ('date_updated', models.DateTimeField(auto_now=True, help_text='The datetime this was updated')),
+                ('day', models.DateField(help_text='The day the orders were placed on')),
+                ('orders', models.PositiveIntegerField(default=0, help_text='How many orders were placed')),
+                ('units', models.PositiveBigIntegerField(default=0, help_text='How many units were sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='The subtotal of the lines sold, excluding shipping and VAT', max_digits=16)),
+                ('seller', models.ForeignKey(help_text='The seller that supplied the lines', on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily seller sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, help_text='The datetime this was created')),
+                ('date_updated', models.DateTimeField(auto_now=True, help_text='The datetime this was updated')),
+                ('day', models.DateField(help_text='The day the orders were placed on')),
+                ('orders', models.PositiveIntegerField(default=0, help_text='How many orders were placed')),
+                ('units', models.PositiveBigIntegerField(default=0, help_text='How many units were sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='The subtotal of the lines sold, excluding shipping and VAT', max_digits=16)),
+                ('product', models.ForeignKey(help_text='The product that was sold', on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='product.product')),
+            ],
+            options={
+                'verbose_name_plural': 'daily product sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBuyerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, help_text='The datetime this was created')),
+                ('date_updated', models.DateTimeField(auto_now=True, help_text='The datetime this was updated')),
+                ('day', models.DateField(help_text='The day the orders were placed on')),
+                ('orders', models.PositiveIntegerField(default=0, help_text='How many orders were placed')),
+                ('units', models.PositiveBigIntegerField(default=0, help_text='How many units were sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='The subtotal of the lines sold, excluding shipping and VAT', max_digits=16)),
+                ('buyer', models.ForeignKey(help_text='The buyer that placed the orders', on_delete=django.db.models.deletion.CASCADE, related_name='daily_purchases', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily buyer sales',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysellersales',
+            constraint=models.UniqueConstraint(fields=('seller', 'day'), name='dailysellersales_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='dailyproductsales_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybuyersales',
+            constraint=models.UniqueConstraint(fields=('buyer', 'day'), name='dailybuyersales_unique_day'),
+        ),
+    ]
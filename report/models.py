@@ -0,0 +1,76 @@
+from django.db import models
+
+from supply.generics.mixins import ModelWithDatetime
+
+
+class DailySales(ModelWithDatetime):
+    """
+    The sales of a single day, rolled up from the lines of the orders placed
+    that day so that reports don't have to go through every line. Kept up to
+    date by report.rollups as orders are placed.
+    """
+    day = models.DateField(
+        help_text="The day the orders were placed on"
+    )
+    orders = models.PositiveIntegerField(
+        default=0,
+        help_text="How many orders were placed"
+    )
+    units = models.PositiveBigIntegerField(
+        default=0,
+        help_text="How many units were sold"
+    )
+    revenue = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        help_text="The subtotal of the lines sold, excluding shipping and VAT"
+    )
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(DailySales):
+    product = models.ForeignKey(
+        to="product.Product",
+        on_delete=models.CASCADE,
+        related_name="daily_sales",
+        help_text="The product that was sold"
+    )
+
+    class Meta:
+        verbose_name_plural = "daily product sales"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="dailyproductsales_unique_day"),
+        ]
+
+
+class DailySellerSales(DailySales):
+    seller = models.ForeignKey(
+        to="user.User",
+        on_delete=models.CASCADE,
+        related_name="daily_sales",
+        help_text="The seller that supplied the lines"
+    )
+
+    class Meta:
+        verbose_name_plural = "daily seller sales"
+        constraints = [
+            models.UniqueConstraint(fields=["seller", "day"], name="dailysellersales_unique_day"),
+        ]
+
+
+class DailyBuyerSales(DailySales):
+    buyer = models.ForeignKey(
+        to="user.User",
+        on_delete=models.CASCADE,
+        related_name="daily_purchases",
+        help_text="The buyer that placed the orders"
+    )
+
+    class Meta:
+        verbose_name_plural = "daily buyer sales"
+        constraints = [
+            models.UniqueConstraint(fields=["buyer", "day"], name="dailybuyersales_unique_day"),
+        ]
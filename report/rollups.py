@@ -0,0 +1,111 @@
+"""
+Maintains the daily sales rollups of report.models.
+
+The totals are worked out by the database with a single INSERT .. SELECT per
+rollup, for just the lines of the order that was placed (`add_order`) or for
+every order since a given day (`rebuild`). The SELECT is built by the ORM, the
+upsert around it is plain SQL as Django can't add to existing rows on conflict.
+"""
+from datetime import datetime, time
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from order.models import Allocation, OrderLine
+from report.models import DailyBuyerSales, DailyProductSales, DailySellerSales
+
+
+def get_totals(rows, key, order, units, revenue):
+    """
+    The daily totals of `rows` per `key`, where `order` is the path to the order
+    of a row
+    """
+    # the columns come out in the order upsert inserts them in
+    return rows.values(
+        rollup_key=F(key), rollup_day=TruncDate(f"{order}__date_confirmed"),
+    ).annotate(
+        orders=Count(f"{order}__id", distinct=True),
+        units=Sum(units),
+        revenue=Sum(revenue, output_field=DecimalField()),
+    ).order_by("rollup_key", "rollup_day")
+
+
+def get_line_totals(key):
+    return lambda lines: get_totals(lines, key, "order", "quantity", "subtotal")
+
+
+def get_seller_totals(lines):
+    """
+    A line can be split over the offers of several sellers (see order.allocation),
+    so every seller is credited with what their own offers supplied of it, at the
+    price of the line
+    """
+    return get_totals(
+        Allocation.objects.filter(line__in=lines),
+        "seller_id",
+        "line__order",
+        "quantity",
+        F("quantity") * F("line__price"),
+    )
+
+
+# every rollup, what it's keyed on and how its totals are worked out from the
+# lines. Checkouts always upsert them in this order (and the rows by key) so
+# that concurrent ones can't deadlock
+ROLLUPS = [
+    (DailyProductSales, "product", get_line_totals("product_id")),
+    (DailySellerSales, "seller", get_seller_totals),
+    (DailyBuyerSales, "buyer", get_line_totals("order__buyer_id")),
+]
+
+
+def upsert(model, field, totals):
+    """
+    Adds `totals` (see get_totals) to the rollup, creating the rows for any days
+    that aren't there yet
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    key_column = quote(model._meta.get_field(field).column)
+    sql, params = totals.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({key_column}, "day", "orders", "units", "revenue", "date_created", "date_updated")
+            SELECT totals.*, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM ({sql}) totals
+            ON CONFLICT ({key_column}, "day") DO UPDATE SET
+                "orders" = {table}."orders" + excluded."orders",
+                "units" = {table}."units" + excluded."units",
+                "revenue" = {table}."revenue" + excluded."revenue",
+                "date_updated" = excluded."date_updated"
+            """,
+            params,
+        )
+
+
+def add_order(order):
+    """
+    Adds a confirmed order to every rollup
+    """
+    lines = OrderLine.objects.filter(order=order)
+    for model, field, get_totals_of in ROLLUPS:
+        upsert(model, field, get_totals_of(lines))
+
+
+def rebuild(since=None):
+    """
+    Recomputes every rollup from the order lines (and their allocations), from
+    the day `since` onwards or from scratch
+    """
+    lines = OrderLine.objects.filter(order__is_confirmed=True)
+    if since:
+        lines = lines.filter(order__date_confirmed__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    with transaction.atomic():
+        for model, field, get_totals_of in ROLLUPS:
+            rollups = model.objects.all()
+            if since:
+                rollups = rollups.filter(day__gte=since)
+            rollups.delete()
+            upsert(model, field, get_totals_of(lines))
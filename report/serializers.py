@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+class ReportFilterSerializer(serializers.Serializer):
+    """
+    The days a report covers, the last 30 by default
+    """
+    date_from = serializers.DateField(
+        required=False,
+        help_text="The first day of the report",
+    )
+    date_to = serializers.DateField(
+        required=False,
+        help_text="The last day of the report, today by default",
+    )
+
+    def validate(self, attrs):
+        attrs.setdefault("date_to", timezone.localdate())
+        attrs.setdefault("date_from", attrs["date_to"] - timedelta(days=29))
+        if attrs["date_from"] > attrs["date_to"]:
+            raise ValidationError("date_from can't be after date_to.")
+        if (attrs["date_to"] - attrs["date_from"]).days >= settings.REPORT_MAX_DAYS:
+            raise ValidationError(f"A report can cover up to {settings.REPORT_MAX_DAYS} days.")
+        return attrs
+
+
+class DailySalesSerializer(serializers.Serializer):
+    day = serializers.DateField(
+        read_only=True,
+    )
+    orders = serializers.IntegerField(
+        help_text="How many orders were placed",
+        read_only=True,
+    )
+    units = serializers.IntegerField(
+        help_text="How many units were sold",
+        read_only=True,
+    )
+    revenue = serializers.CharField(
+        help_text="The subtotal of the lines sold, excluding shipping and VAT",
+        read_only=True,
+    )
+
+
+class SalesReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField(
+        read_only=True,
+    )
+    date_to = serializers.DateField(
+        read_only=True,
+    )
+    orders = serializers.IntegerField(
+        help_text="How many orders were placed",
+        read_only=True,
+    )
+    units = serializers.IntegerField(
+        help_text="How many units were sold",
+        read_only=True,
+    )
+    revenue = serializers.CharField(
+        help_text="The subtotal of the lines sold, excluding shipping and VAT",
+        read_only=True,
+    )
+    days = DailySalesSerializer(
+        many=True,
+        read_only=True,
+        help_text="The totals of every day in the report that had any sales",
+    )
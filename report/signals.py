@@ -0,0 +1,13 @@
+from django.dispatch import receiver
+
+from order.signals import order_confirmed
+from report import rollups
+
+
+@receiver(order_confirmed)
+def add_order_to_rollups(sender, order, **kwargs):
+    """
+    Adds the order to the sales rollups as part of the checkout, so that they
+    always match the orders
+    """
+    rollups.add_order(order)
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.test import override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from product.factories import OfferFactory
+from product.models import Product
+from report import rollups
+from user.factories import UserFactory
+
+
+@override_settings(CART_RESERVATIONS=False, DEFERRED_AGGREGATES=False)
+class RollupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        cls.cheap = OfferFactory(quantity=3, seller_price=Decimal("10.00"))
+        cls.split = cls.cheap.product
+        cls.pricier = OfferFactory(product=cls.split, quantity=10, seller_price=Decimal("20.00"))
+        cls.single = OfferFactory(seller=cls.pricier.seller, quantity=10, seller_price=Decimal("5.00")).product
+        Product.objects.refresh_aggregates()
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+        # 3 of the first line from the cheap offer and 2 from the pricier one, whose
+        # seller also has the other product
+        self.place_order([{"id": self.split.id, "quantity": 5}, {"id": self.single.id, "quantity": 1}])
+        # the cheap offer is sold out, so this all comes from the pricier one
+        self.place_order([{"id": self.split.id, "quantity": 1}])
+
+    def place_order(self, items):
+        self.assertEqual(self.client.post("/api/orders/update_cart/", items, format="json").status_code, 200)
+        self.assertEqual(self.client.post("/api/orders/checkout/").status_code, 200)
+
+    def get_report(self, path, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        (day,) = response.data["days"]
+        self.assertEqual(
+            [response.data[total] for total in ["orders", "units", "revenue"]],
+            [day["orders"], day["units"], day["revenue"]],
+        )
+        return day["orders"], day["units"], day["revenue"]
+
+    def assert_reports(self):
+        # the split line sold at 16.80 and the other product at 5.60
+        self.assertEqual(self.get_report("/api/reports/purchases/", self.buyer), (2, 7, "106.40"))
+        self.assertEqual(self.get_report("/api/reports/sales/", self.cheap.seller), (1, 3, "50.40"))
+        self.assertEqual(self.get_report("/api/reports/sales/", self.pricier.seller), (2, 4, "56.00"))
+        admin = UserFactory(is_staff=True)
+        self.assertEqual(self.get_report(f"/api/reports/products/{self.split.id}/", admin), (2, 6, "100.80"))
+        self.assertEqual(self.get_report(f"/api/reports/products/{self.single.id}/", admin), (1, 1, "5.60"))
+
+    def get_rollups(self):
+        return [
+            sorted(model.objects.values_list(field, "day", "orders", "units", "revenue"))
+            for model, field, _ in rollups.ROLLUPS
+        ]
+
+    def test_checkout(self):
+        self.assert_reports()
+
+    def test_rebuild(self):
+        # rebuilding them from the orders gives what the checkouts added up
+        checked_out = self.get_rollups()
+        rollups.rebuild()
+        self.assertEqual(self.get_rollups(), checked_out)
+        self.assert_reports()
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from rest_framework import response, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+from product.models import Product
+from report.models import DailyBuyerSales, DailyProductSales, DailySellerSales
+from report.serializers import ReportFilterSerializer, SalesReportSerializer
+
+
+class ReportViewSet(viewsets.GenericViewSet):
+    """
+    Sales reports, read from the daily rollups (see report.rollups) rather than
+    the order lines, so a report takes as long for a year of busy trading as
+    for a single order
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_report(self, request, rollups):
+        params = ReportFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        date_from = params.validated_data["date_from"]
+        date_to = params.validated_data["date_to"]
+
+        days = list(
+            rollups.filter(day__gte=date_from, day__lte=date_to).order_by("day").values(
+                "day", "orders", "units", "revenue"
+            )
+        )
+        report = {
+            "date_from": date_from,
+            "date_to": date_to,
+            # every order is placed on a single day, so they add up
+            "orders": sum(day["orders"] for day in days),
+            "units": sum(day["units"] for day in days),
+            "revenue": sum((day["revenue"] for day in days), Decimal("0.00")),
+            "days": days,
+        }
+        return response.Response(SalesReportSerializer(report).data)
+
+    @action(methods=['GET'], detail=False)
+    def purchases(self, request):
+        """
+        What the logged in user bought, per day
+        """
+        return self.get_report(request, DailyBuyerSales.objects.filter(buyer=request.user))
+
+    @action(methods=['GET'], detail=False)
+    def sales(self, request):
+        """
+        What the logged in user sold as a seller, per day
+        """
+        return self.get_report(request, DailySellerSales.objects.filter(seller=request.user))
+
+    @action(
+        methods=['GET'], detail=False, url_path=r"products/(?P<product_id>[0-9]+)", permission_classes=[IsAdminUser]
+    )
+    def product(self, request, product_id):
+        """
+        How much of a product was sold across all sellers, per day
+        """
+        if not Product.objects.filter(pk=product_id).exists():
+            raise NotFound()
+        return self.get_report(request, DailyProductSales.objects.filter(product_id=product_id))
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+
+def make_etag(request, *parts):
+    """
+    Hashes the given parts into an ETag. The negotiated format is included so
+    the JSON and browsable API representations don't share a tag.
+    """
+    renderer = getattr(request, "accepted_renderer", None)
+    parts = (request.get_full_path(), getattr(renderer, "format", ""), *parts)
+    return hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def conditional_view(state_func):
+    """
+    Answers conditional GETs on a viewset action with a 304 before the view
+    runs, so nothing is fetched or serialized when the client is up to date.
+
+    `state_func(request, *args, **kwargs)` should cheaply return a tuple of
+    `(last_modified, *anything else that changes the response)`, or None when
+    there is nothing to compare against. It is only called for GET/HEAD.
+
+    Async actions take an async `state_func`.
+    """
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            return async_conditional_view(state_func)(method)
+        return sync_conditional_view(state_func)(method)
+
+    return decorator
+
+
+def sync_conditional_view(state_func):
+    def get_state(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        # condition() asks for the etag and the last modified date separately,
+        # so keep the state around for the second call
+        if not hasattr(request, "_conditional_state"):
+            request._conditional_state = state_func(request, *args, **kwargs)
+        return request._conditional_state
+
+    def etag_func(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        return make_etag(request, *state) if state else None
+
+    def last_modified_func(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        return state[0] if state else None
+
+    return method_decorator(condition(etag_func=etag_func, last_modified_func=last_modified_func))
+
+
+def async_conditional_view(state_func):
+    """
+    Django's condition() can't wrap a coroutine, so this does the same thing for
+    async actions
+    """
+    def decorator(method):
+        @wraps(method)
+        async def inner(self, request, *args, **kwargs):
+            state = None
+            if request.method in ("GET", "HEAD"):
+                state = await state_func(request, *args, **kwargs)
+
+            etag = quote_etag(make_etag(request, *state)) if state else None
+            last_modified = None
+            if state and state[0]:
+                last_modified = state[0]
+                if not timezone.is_aware(last_modified):
+                    last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+                last_modified = int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await method(self, request, *args, **kwargs)
+
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return inner
+
+    return decorator
@@ -0,0 +1,62 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import pagination
+
+
+class AsyncPaginationMixin:
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # the async ORM in Django 4.1 runs every query in a thread as well, this
+        # does the same for the page (and anything prefetched for it)
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+
+class PageNumberPagination(AsyncPaginationMixin, pagination.PageNumberPagination):
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "PAGINATION_MAX_PAGE_SIZE", 200)
+
+
+class CursorPagination(AsyncPaginationMixin, pagination.CursorPagination):
+    """
+    Keyset pagination, which avoids the COUNT(*) and the OFFSET of page number
+    pagination so it costs the same however deep into the results a client
+    pages. Views can set `pagination_ordering` to a unique, immutable field
+    (or fields) to page over, defaulting to the primary key.
+
+    Passing `?page=` falls back to page number pagination, mostly so that the
+    browsable API can still jump to a given page.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "PAGINATION_MAX_PAGE_SIZE", 200)
+    page_number_pagination_class = PageNumberPagination
+
+    page_number_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_number_pagination_class.page_query_param in request.query_params:
+            self.page_number_pagination = self.page_number_pagination_class()
+            return self.page_number_pagination.paginate_queryset(
+                queryset.order_by(*self.get_ordering(request, queryset, view)), request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "pagination_ordering", None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_pagination:
+            return self.page_number_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.page_number_pagination:
+            return self.page_number_pagination.get_html_context()
+        return super().get_html_context()
+
+    def to_html(self):
+        if self.page_number_pagination:
+            return self.page_number_pagination.to_html()
+        return super().to_html()
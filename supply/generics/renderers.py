@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    DRF's JSONRenderer, but encoding with orjson when it's installed. The output
+    is the same byte for byte: orjson is compact and UTF-8 like DRF's defaults,
+    and anything it would encode differently (datetimes, Decimals and the like)
+    is handed to DRF's encoder. Indented JSON, i.e for the browsable API, and
+    anything orjson can't encode at all still go through the stdlib.
+    """
+    orjson_options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # the same escaping as DRF, these are valid JSON but not valid javascript
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+class StreamingRenderer(renderers.BaseRenderer):
+    """
+    A renderer for rows of data that can also encode them one at a time with
+    `stream`, to pass on to a StreamingHttpResponse. `render` is for anything
+    that's already in memory, i.e an error response.
+
+    Subclasses implement `encode`, which yields each row as a string; `stream`
+    joins those up into chunks of around `chunk_size` characters so that the
+    server isn't writing to the socket for every row.
+    """
+    chunk_size = 64 * 1024
+
+    def encode(self, rows, fields):
+        raise NotImplementedError
+
+    def stream(self, rows, fields):
+        chunk = []
+        size = 0
+        for row in self.encode(rows, fields):
+            chunk.append(row)
+            size += len(row)
+            if size >= self.chunk_size:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield "".join(chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows and isinstance(rows[0], dict) else ["detail"]
+        rows = [row if isinstance(row, dict) else {"detail": row} for row in rows]
+        return "".join(self.stream(rows, fields)).encode(self.charset)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def encode(self, rows, fields):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    encoder = DjangoJSONEncoder()
+
+    def get_cell(self, value):
+        if isinstance(value, datetime):
+            # the same format as the JSON output
+            return self.encoder.default(value)
+        if isinstance(value, list):
+            # i.e the messages of an error response
+            return "; ".join(map(str, value))
+        return value
+
+    def encode(self, rows, fields):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return value
+
+        writer.writeheader()
+        yield flush()
+        for row in rows:
+            writer.writerow({field: self.get_cell(value) for field, value in row.items()})
+            yield flush()
@@ -0,0 +1,65 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+
+class ValuesMapper:
+    """
+    Turns rows from `values()` into exactly what `serializer_class` would give
+    for the model instances, without the per-field overhead of the serializer.
+    The fields are worked out once, up front: every one becomes the lookup to
+    read it from and the function that converts it, i.e `str` for a CharField.
+
+    Fields that aren't a plain model field or lookup (a SerializerMethodField,
+    a nested serializer or a property) need to be given a source in `sources`:
+    the name of the value in the row to use as is (i.e an annotation, or the
+    column the method would return), or None if the caller fills in the value
+    itself under the field's name.
+
+        mapper = ValuesMapper(ProductSerializer, sources={"in_stock": "in_stock"})
+        rows = queryset.annotate(in_stock=...).values(*mapper.lookups)
+        data = [mapper(row) for row in rows]
+    """
+    converters = {
+        serializers.CharField: str,
+        serializers.IntegerField: int,
+        # the database only has true and false (or 1 and 0), which is all BooleanField
+        # has to handle here
+        serializers.BooleanField: bool,
+    }
+
+    def __init__(self, serializer_class, sources=None):
+        sources = sources or {}
+        self.lookups = []
+        self.fields = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in sources:
+                lookup = sources[name]
+                key = lookup or name
+                convert = None if isinstance(field, serializers.SerializerMethodField) else self.get_converter(field)
+            elif field.source == "*" or isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name} can't be read from values() without a source"
+                )
+            else:
+                lookup = key = field.source.replace(".", "__")
+                convert = self.get_converter(field)
+            if lookup:
+                self.lookups.append(lookup)
+            self.fields.append((name, key, convert))
+
+    def get_converter(self, field):
+        if isinstance(field, serializers.BaseSerializer):
+            return None
+        for field_class in type(field).__mro__:
+            if field_class in self.converters:
+                return self.converters[field_class]
+        raise ImproperlyConfigured(f"{type(field).__name__} isn't supported by ValuesMapper")
+
+    def __call__(self, row):
+        # like Serializer.to_representation, None is left as is rather than converted
+        return {
+            name: row[key] if convert is None or row[key] is None else convert(row[key])
+            for name, key, convert in self.fields
+        }
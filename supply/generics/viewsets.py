@@ -1,7 +1,13 @@
+import asyncio
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from rest_framework.mixins import (
     RetrieveModelMixin,
     ListModelMixin,
 )
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 
@@ -11,3 +17,121 @@ class QualifiedViewSet(
     GenericViewSet
 ):
     pass
+
+
+class AsyncViewSetMixin:
+    """
+    Lets a viewset implement some of its actions as coroutines. Routes with an
+    async action get an async view, so under ASGI those requests don't hold on
+    to a thread while they wait on the database. Any sync actions on the same
+    route are run in a thread like Django would for a sync view.
+
+    DRF itself is synchronous, so the authentication, permission checks and
+    content negotiation still run in a thread before the action is awaited.
+    """
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not any(asyncio.iscoroutinefunction(getattr(cls, action, None)) for action in actions.values()):
+            return view
+
+        actions = dict(actions)
+        if "get" in actions and "head" not in actions:
+            actions["head"] = actions["get"]
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            if not action or not asyncio.iscoroutinefunction(getattr(cls, action, None)):
+                return await sync_view(request, *args, **kwargs)
+
+            # the same set up as the view from ViewSetMixin.as_view
+            self = cls(**view.initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # keeps cls, initkwargs, actions and csrf_exempt around for the router and schema generation
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        APIView.dispatch for async actions
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower())
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        """
+        ListModelMixin.list for async actions. The serializers mustn't touch the
+        database, so anything they need should be prefetched by the queryset.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+
+class ValuesListMixin:
+    """
+    A fast path for the list action. With `values_mapper` set to a
+    supply.generics.serializers.ValuesMapper for the serializer, the page is
+    fetched as `values()` and mapped straight to the response data, skipping
+    the model instances and the serializer fields while giving the exact same
+    output. Anything the mapper reads that isn't a field can be added with
+    `values_annotations`.
+
+    Turned off with the FAST_SERIALIZATION setting, in which case the list goes
+    through the serializer as usual.
+    """
+    values_mapper = None
+    values_annotations = {}
+
+    def use_values(self):
+        return self.values_mapper is not None and settings.FAST_SERIALIZATION
+
+    def get_values_queryset(self, queryset):
+        # the id is needed for the pagination (and anything looked up per row) even
+        # if it isn't in the output, and prefetching doesn't work with values()
+        lookups = dict.fromkeys(["id", *self.values_mapper.lookups])
+        return queryset.prefetch_related(None).annotate(**self.values_annotations).values(*lookups)
+
+    def serialize_values(self, rows):
+        return [self.values_mapper(row) for row in rows]
+
+    def list_values(self, request):
+        queryset = self.get_values_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_values(page))
+        return Response(self.serialize_values(queryset))
+
+    def list(self, request, *args, **kwargs):
+        if self.use_values():
+            return self.list_values(request)
+        return super().list(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        if self.use_values():
+            # like the async ORM in Django 4.1, the queries are run in a thread
+            return await sync_to_async(self.list_values)(request)
+        return await super().alist(request, *args, **kwargs)
@@ -0,0 +1,175 @@
+import cProfile
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("supply.requests")
+
+
+class RequestStats:
+    """
+    What a single request did in the database, collected by wrapping every query
+    it runs
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.statements = Counter()
+        self.started = time.perf_counter()
+        self.view_finished = None
+        self.render_finished = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            # the parameters aren't part of the statement, so the same query for a
+            # different row counts as a repeat
+            self.statements[sql] += 1
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts and times the queries every request makes and reports them in a
+    Server-Timing header, along with the time spent in the view (which is where
+    the serializers run, so it includes them), rendering its data into the
+    response body and the total. Requests over the query or duration budgets are logged, and so are
+    statements that ran suspiciously often, which usually means an N+1.
+
+    Only enabled with the REQUEST_INSTRUMENTATION setting.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        request.query_stats = stats
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - stats.started
+
+        response["Server-Timing"] = ", ".join(self.get_timings(stats, total))
+        self.check_budgets(request, response, stats, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, which is when the
+        # data the serializers returned in the view is turned into JSON
+        request.query_stats.view_finished = time.perf_counter()
+
+        def rendered(response):
+            request.query_stats.render_finished = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def get_timings(self, stats, total):
+        timings = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+        if stats.view_finished and stats.render_finished:
+            timings.append(f'view;dur={(stats.view_finished - stats.started) * 1000:.1f}')
+            timings.append(f'render;dur={(stats.render_finished - stats.view_finished) * 1000:.1f}')
+        timings.append(f'total;dur={total * 1000:.1f}')
+        return timings
+
+    def check_budgets(self, request, response, stats, total):
+        if stats.queries > settings.REQUEST_QUERY_BUDGET or total * 1000 > settings.REQUEST_DURATION_BUDGET:
+            logger.warning(
+                "%s %s (%s) took %.0fms and %s queries (%.0fms in the database)",
+                request.method, request.get_full_path(), response.status_code,
+                total * 1000, stats.queries, stats.db_time * 1000,
+            )
+        for sql, count in stats.statements.most_common():
+            if count < settings.REQUEST_REPEATED_QUERY_THRESHOLD:
+                break
+            logger.warning(
+                "%s %s ran the same query %s times, possibly an N+1: %s",
+                request.method, request.get_full_path(), count, sql,
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of viewset actions (PROFILE_SAMPLE_RATE of them, limited to
+    PROFILE_ACTIONS if that's set) with cProfile, plus any request from a staff
+    user that sends the X-Profile header. Only users logged in with a session are
+    known before the view runs, so the header is ignored for everyone else (API
+    tokens included) rather than profiling the request to find out. The profiles are written to PROFILE_DIR
+    named after the action, user and query count, i.e
+    `20260101T120000000000-OrderViewSet.checkout-user12-26q.prof`, and the oldest are
+    removed once they take up more than PROFILE_MAX_BYTES.
+
+    Only enabled with the PROFILING setting.
+    """
+    # only one profiler can be active at a time, so requests that come in while
+    # another one is being profiled are skipped
+    lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profile = getattr(request, "profile", None)
+        if profile:
+            profiler, stats, action, stack = profile
+            profiler.disable()
+            stack.close()
+            self.lock.release()
+            self.save(profiler, action, request.user, stats.queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions = getattr(view_func, "actions", None)
+        if not actions or request.method.lower() not in actions:
+            return None
+        action = f"{view_func.cls.__name__}.{actions[request.method.lower()]}"
+        if settings.PROFILE_ACTIONS and action not in settings.PROFILE_ACTIONS:
+            return None
+
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        # the header is checked before anything is profiled, so that sending it doesn't cost
+        # anyone else the profiler overhead or take the lock from the sampled requests
+        requested = "HTTP_X_PROFILE" in request.META and request.user.is_staff
+        if not (sampled or requested) or not self.lock.acquire(blocking=False):
+            return None
+
+        stats = RequestStats()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        profiler = cProfile.Profile()
+        request.profile = profiler, stats, action, stack
+        profiler.enable()
+        return None
+
+    def save(self, profiler, action, user, queries):
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        user = f"user{user.pk}" if user.is_authenticated else "anonymous"
+        profiler.dump_stats(directory / f"{timestamp}-{action}-{user}-{queries}q.prof")
+
+        profiles = sorted(directory.glob("*.prof"), key=lambda path: path.stat().st_mtime, reverse=True)
+        size = 0
+        for path in profiles:
+            size += path.stat().st_size
+            if size > settings.PROFILE_MAX_BYTES:
+                path.unlink(missing_ok=True)
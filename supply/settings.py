@@ -39,26 +39,35 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'product',
     'supply',
     'order',
     'user',
+    'job',
+    'report',
     'rest_framework',
     'knox',
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication','rest_framework.authentication.SessionAuthentication'),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_AUTHENTICATION_CLASSES': ('user.authentication.CachedTokenAuthentication','rest_framework.authentication.SessionAuthentication'),
+    'DEFAULT_PAGINATION_CLASS': 'supply.generics.pagination.CursorPagination',
     'PAGE_SIZE': 50,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # uses orjson, if it's installed, for the same output but faster
+        'supply.generics.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ]
 
 }
 
+# The largest page a client can ask for with ?page_size=
+PAGINATION_MAX_PAGE_SIZE = 200
+
 MIDDLEWARE = [
+    'supply.middleware.QueryInstrumentationMiddleware',
+    'supply.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -104,6 +113,89 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# use a shared backend (i.e redis or memcached) in production so that every
+# worker sees the same catalog version, and for the auth tokens to be cached
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# How long, in seconds, catalog responses are cached for. Entries are
+# invalidated as soon as the catalog changes regardless of this
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# How long, in seconds, a verified auth token is cached for so that requests
+# don't have to look it up. Logging out takes effect immediately regardless.
+# Tokens are only cached with a shared CACHE_BACKEND, a per-process one (like
+# the default) can't tell the other workers about a logout
+TOKEN_CACHE_TTL = 5 * 60
+
+# How many GTINs /api/products/resolve/ takes at once
+GTIN_RESOLVE_LIMIT = 5000
+
+# How many items /api/orders/update_cart/ takes at once
+CART_UPDATE_LIMIT = 500
+
+# The most days a sales report can cover
+REPORT_MAX_DAYS = 366
+
+# How many rows the order export reads from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+# Whether the list endpoints build their responses straight from values() rather
+# than through the serializers, see supply.generics.viewsets.ValuesListMixin. The
+# output is the same either way
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION') != 'false'
+
+
+# The background job queue, see job.queue. Failed jobs are retried up to
+# JOB_MAX_ATTEMPTS times, JOB_RETRY_DELAY seconds later and twice as long every
+# time after that (up to JOB_MAX_RETRY_DELAY). Jobs that have been running for
+# more than JOB_TIMEOUT seconds are assumed to have lost their worker and retried
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_MAX_RETRY_DELAY = 60 * 60
+JOB_TIMEOUT = 10 * 60
+JOB_POLL_INTERVAL = 1
+
+# Whether the denormalized price/stock of a product is refreshed by a background
+# job after its offers change (i.e at checkout), rather than straight away in the
+# same request. The product list can then lag behind the offers by a moment
+DEFERRED_AGGREGATES = os.environ.get('DEFERRED_AGGREGATES') == 'true'
+
+
+# Whether stock is reserved for the buyer as soon as it's added to their cart,
+# rather than only being taken at checkout. Reservations are given back after
+# CART_RESERVATION_TTL seconds by the release_expired_holds command
+CART_RESERVATIONS = os.environ.get('CART_RESERVATIONS') == 'true'
+CART_RESERVATION_TTL = 15 * 60
+
+
+# Adds a Server-Timing header with the database time, query count and render time
+# to every response, and logs requests that go over these budgets (a number of
+# queries and milliseconds) or repeat the same query REQUEST_REPEATED_QUERY_THRESHOLD
+# times, see supply.middleware
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION') == 'true'
+REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', 30))
+REQUEST_DURATION_BUDGET = int(os.environ.get('REQUEST_DURATION_BUDGET', 500))
+REQUEST_REPEATED_QUERY_THRESHOLD = int(os.environ.get('REQUEST_REPEATED_QUERY_THRESHOLD', 5))
+
+# Profiles PROFILE_SAMPLE_RATE (0 to 1) of the viewset actions, and any from a staff
+# user (logged in with a session) sending an X-Profile header, writing the profiles
+# to PROFILE_DIR. Actions can be narrowed down with i.e
+# PROFILE_ACTIONS=OrderViewSet.checkout,ProductViewSet.list
+PROFILING = os.environ.get('PROFILING') == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ACTIONS = [action for action in os.environ.get('PROFILE_ACTIONS', '').split(',') if action]
+PROFILE_DIR = os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles')
+PROFILE_MAX_BYTES = int(os.environ.get('PROFILE_MAX_BYTES', 100 * 1024 * 1024))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,82 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from order.models import Order, OrderLine
+from product.factories import OfferFactory, ProductFactory
+from product.models import Product
+from supply.generics import renderers
+from user.factories import UserFactory
+
+
+class FastSerializationTests(APITestCase):
+    """
+    The values() fast path and the orjson renderer should give exactly the same
+    bytes as the serializers and DRF's own renderer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserFactory()
+        names = ["Crème Brûlée", "寿司 🍣", "Line\u2028separator", 'A "quoted" \\ name']
+        for name in names:
+            OfferFactory(product=ProductFactory(name=name), quantity=10, seller_price=Decimal("3.33"))
+        Product.objects.refresh_aggregates()
+        # a product whose price hasn't been worked out (yet)
+        Product.objects.filter(name=names[-1]).update(price=None)
+
+        for product in Product.objects.order_by("id"):
+            order = Order.objects.create(
+                buyer=cls.buyer,
+                is_confirmed=True,
+                subtotal=Decimal("7.99"),
+                shipping_cost=Decimal("15.00"),
+                vat=Decimal("4.83"),
+                total=Decimal("27.82"),
+            )
+            OrderLine.objects.create(
+                order=order,
+                product=product,
+                seller=cls.buyer,
+                quantity=1,
+                price=Decimal("7.99"),
+                subtotal=Decimal("7.99"),
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.buyer)
+
+    def get(self, path, fast, use_orjson):
+        # the catalog cache would otherwise answer with whatever the first request rendered
+        cache.clear()
+        with (
+            override_settings(FAST_SERIALIZATION=fast),
+            mock.patch.object(renderers, "orjson", renderers.orjson if use_orjson else None),
+        ):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_same_bytes(self, path):
+        expected = self.get(path, fast=False, use_orjson=False)
+        for fast, use_orjson in [(False, True), (True, False), (True, True)]:
+            self.assertEqual(
+                self.get(path, fast, use_orjson), expected, f"fast path: {fast}, orjson: {use_orjson}"
+            )
+        return expected
+
+    def test_product_list(self):
+        content = self.assert_same_bytes("/api/products/?page_size=3")
+        self.assertIn("Crème Brûlée".encode(), content)
+        self.assertIn(b"Line\\u2028separator", content)
+        self.assertIn(b'"price":"3.73"', content)
+        self.assertIn(b'"price":null', self.assert_same_bytes("/api/products/"))
+
+    def test_order_list(self):
+        content = self.assert_same_bytes("/api/orders/?page_size=3")
+        self.assertIn("寿司 🍣".encode(), content)
+        self.assertIn(b'"total":"27.82"', content)
+        self.assert_same_bytes("/api/orders/")
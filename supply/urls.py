@@ -3,7 +3,8 @@ from django.urls import include, path, re_path
 from rest_framework import routers
 
 from order.viewsets import OrderViewSet
-from product.viewsets import ProductViewSet
+from product.viewsets import OfferViewSet, ProductViewSet
+from report.viewsets import ReportViewSet
 from knox import views as knox_views
 
 from user.viewsets import AuthenticationViewset
@@ -11,6 +12,8 @@ from user.viewsets import AuthenticationViewset
 router = routers.DefaultRouter()
 router.register(r'orders', OrderViewSet)
 router.register(r'products', ProductViewSet)
+router.register(r'offers', OfferViewSet, basename="offers")
+router.register(r'reports', ReportViewSet, basename="reports")
 router.register(r'auth/login', AuthenticationViewset, basename="login")
 
 urlpatterns = [
@@ -0,0 +1,85 @@
+"""
+Token authentication that doesn't hit the database on every request.
+
+Knox looks the token up by its prefix and loads the user for every request.
+Here the verified token and its user are cached under the token's digest for
+TOKEN_CACHE_TTL seconds (or until the token expires, if that's sooner). The
+digest is still computed and has to match, so a cache entry is only any use to
+someone holding the token itself. Deleting a token (logout, logoutall, expiry)
+or saving its user drops the cached entries, see user.signals.
+
+That only reaches every worker through a shared cache (i.e redis or memcached).
+With a per-process one, like the default LocMemCache, a worker that didn't
+handle the logout would keep accepting the token, so nothing is cached and
+every request looks the token up as knox would.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from knox.settings import CONSTANTS, knox_settings
+from rest_framework import exceptions
+
+
+def is_cache_shared():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def make_key(digest):
+    return f"auth:token:{digest}"
+
+
+def forget_tokens(digests):
+    """
+    Drops the given tokens from the cache once the current transaction commits
+    """
+    if not is_cache_shared():
+        return
+    keys = [make_key(digest) for digest in digests]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def remember_token(auth_token):
+    timeout = settings.TOKEN_CACHE_TTL
+    if auth_token.expiry:
+        timeout = min(timeout, (auth_token.expiry - timezone.now()).total_seconds())
+    if timeout > 0:
+        cache.set(make_key(auth_token.digest), (auth_token.user, auth_token.expiry), timeout=timeout)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, token):
+        try:
+            digest = hash_token(token.decode("utf-8"))
+        except (TypeError, ValueError):
+            raise exceptions.AuthenticationFailed("Invalid token.")
+
+        if not is_cache_shared():
+            return super().authenticate_credentials(token)
+
+        cached = cache.get(make_key(digest))
+        if cached is None:
+            user, auth_token = super().authenticate_credentials(token)
+            remember_token(auth_token)
+            return user, auth_token
+
+        user, expiry = cached
+        if expiry is not None and expiry < timezone.now():
+            # let knox clean it up
+            cache.delete(make_key(digest))
+            return super().authenticate_credentials(token)
+
+        # logout deletes request.auth, so this needs to be a token it can delete
+        auth_token = AuthToken(
+            digest=digest, token_key=token[:CONSTANTS.TOKEN_KEY_LENGTH].decode(), user=user, expiry=expiry
+        )
+        if knox_settings.AUTO_REFRESH and expiry:
+            self.renew_token(auth_token)
+            remember_token(auth_token)
+        return self.validate_user(auth_token)
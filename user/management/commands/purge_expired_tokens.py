@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from knox.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired auth tokens in batches, as every login creates a new one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            digests = list(
+                AuthToken.objects.filter(expiry__lt=now).values_list('digest', flat=True)[:options['batch_size']]
+            )
+            if not digests:
+                break
+            deleted += AuthToken.objects.filter(digest__in=digests).delete()[0]
+
+        print(f"--- Deleted {deleted} expired tokens")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from knox.models import AuthToken
+
+from user.authentication import forget_tokens
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_deleted_token(sender, instance, **kwargs):
+    """
+    Logging out (or out everywhere) deletes the tokens, which has to take effect
+    straight away rather than once the cached token times out
+    """
+    forget_tokens([instance.digest])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    # the user is cached along with their tokens, i.e deactivating them should log them out
+    if not created and update_fields != frozenset({"last_login"}):
+        forget_tokens(AuthToken.objects.filter(user=instance).values_list("digest", flat=True))